@@ -0,0 +1,153 @@
+"""adding cafe changes outbox
+
+Revision ID: c2d7e5a9b413
+Revises: d41959688955
+Create Date: 2024-07-18 10:21:05.604112
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "c2d7e5a9b413"
+down_revision: Union[str, None] = "d41959688955"
+branch_labels: Union[str, Sequence[str], None] = (
+    None
+)
+depends_on: Union[str, Sequence[str], None] = None
+
+WATCHED_TABLES = (
+    "cafes",
+    "geodatas",
+    "descriptions",
+    "companies",
+    "roasters",
+)
+
+
+def upgrade() -> None:
+    op.create_table(
+        "cafe_changes",
+        sa.Column(
+            "id", sa.BigInteger(), nullable=False
+        ),
+        sa.Column(
+            "txid",
+            sa.BigInteger(),
+            server_default=sa.text(
+                "txid_current()"
+            ),
+            nullable=False,
+        ),
+        sa.Column(
+            "cafe_id", sa.String(), nullable=False
+        ),
+        sa.Column(
+            "source", sa.String(), nullable=False
+        ),
+        sa.Column(
+            "operation",
+            sa.String(),
+            nullable=False,
+        ),
+        sa.Column(
+            "created_at",
+            sa.DateTime(),
+            server_default=sa.text("now()"),
+            nullable=False,
+        ),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        op.f("ix_cafe_changes_txid"),
+        "cafe_changes",
+        ["txid"],
+        unique=False,
+    )
+    op.create_index(
+        op.f("ix_cafe_changes_created_at"),
+        "cafe_changes",
+        ["created_at"],
+        unique=False,
+    )
+    # Maps a changed row of any watched table to the cafes it is shown in.
+    op.execute(
+        """
+        CREATE FUNCTION record_cafe_changes(
+            source text, operation text, changed jsonb
+        ) RETURNS void AS $$
+        BEGIN
+            INSERT INTO cafe_changes (cafe_id, source, operation)
+            SELECT affected.cafe_id, source, operation
+            FROM (
+                SELECT changed->>'id' AS cafe_id
+                WHERE source = 'cafes'
+                UNION
+                SELECT changed->>'cafe_id'
+                WHERE source IN ('geodatas', 'descriptions')
+                UNION
+                SELECT id FROM cafes
+                WHERE source = 'companies'
+                    AND company_id = changed->>'id'
+                UNION
+                SELECT id FROM cafes
+                WHERE source = 'roasters'
+                    AND roaster_id = changed->>'id'
+            ) AS affected
+            WHERE affected.cafe_id IS NOT NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+        """
+    )
+    op.execute(
+        """
+        CREATE FUNCTION capture_cafe_change() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP <> 'INSERT' THEN
+                PERFORM record_cafe_changes(
+                    TG_TABLE_NAME, TG_OP, to_jsonb(OLD)
+                );
+            END IF;
+            IF TG_OP <> 'DELETE' THEN
+                PERFORM record_cafe_changes(
+                    TG_TABLE_NAME, TG_OP, to_jsonb(NEW)
+                );
+            END IF;
+            PERFORM pg_notify('cafe_changes', '');
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+        """
+    )
+    for table in WATCHED_TABLES:
+        op.execute(
+            f"""
+            CREATE TRIGGER {table}_capture_cafe_change
+            AFTER INSERT OR UPDATE OR DELETE ON {table}
+            FOR EACH ROW EXECUTE FUNCTION capture_cafe_change();
+            """
+        )
+
+
+def downgrade() -> None:
+    for table in WATCHED_TABLES:
+        op.execute(
+            f"DROP TRIGGER {table}_capture_cafe_change ON {table};"
+        )
+    op.execute("DROP FUNCTION capture_cafe_change();")
+    op.execute(
+        "DROP FUNCTION record_cafe_changes(text, text, jsonb);"
+    )
+    op.drop_index(
+        op.f("ix_cafe_changes_created_at"),
+        table_name="cafe_changes",
+    )
+    op.drop_index(
+        op.f("ix_cafe_changes_txid"),
+        table_name="cafe_changes",
+    )
+    op.drop_table("cafe_changes")
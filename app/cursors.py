@@ -0,0 +1,35 @@
+import base64
+import binascii
+from typing import Tuple
+
+
+def encode_cursor(
+    distance: float, cafe_id: str
+) -> str:
+    raw = f"{float(distance).hex()}:{cafe_id}"
+    return (
+        base64.urlsafe_b64encode(raw.encode())
+        .decode()
+        .rstrip("=")
+    )
+
+
+def decode_cursor(
+    cursor: str,
+) -> Tuple[float, str]:
+    try:
+        raw = base64.urlsafe_b64decode(
+            cursor + "=" * (-len(cursor) % 4)
+        ).decode()
+        distance, cafe_id = raw.split(":", 1)
+        if not cafe_id:
+            raise ValueError("empty cafe id")
+        return float.fromhex(distance), cafe_id
+    except (
+        binascii.Error,
+        UnicodeDecodeError,
+        ValueError,
+    ) as e:
+        raise ValueError(
+            f"Malformed cursor: {cursor!r}"
+        ) from e
@@ -0,0 +1,907 @@
+import asyncio
+import hashlib
+import json
+import logging
+from dataclasses import asdict
+from typing import List
+
+import elasticsearch
+from elasticsearch import AsyncElasticsearch
+from elasticsearch.helpers import (
+    async_streaming_bulk,
+)
+
+from app import settings
+from app.suggestions import (
+    SUGGEST_FIELDS,
+    suggestion_index,
+)
+from db import models
+from db.main import sessionmanager
+from db.views import CafeView
+from geoutils import CoordinatesProcessor
+from textutils import InvertedIndex
+from textutils.normalization import (
+    clean_strings,
+    latin_key,
+)
+
+CAFES_INDEX = "cafes"
+DESCRIPTION_FIELDS = (
+    "location_description",
+    "interior_description",
+    "menu_description",
+    "place_history",
+    "arbitrary_description",
+)
+TEXT_FIELDS = (
+    "name",
+    "name_ru",
+    "address",
+    *DESCRIPTION_FIELDS,
+)
+
+# Searches and writes go through this alias. Bump the version whenever
+# CAFES_MAPPINGS changes and the next start rebuilds behind it.
+CAFES_MAPPING_VERSION = 6
+CAFES_SETTINGS = {
+    "number_of_shards": 1,
+    "number_of_replicas": 1,
+    "analysis": {
+        "filter": {
+            "russian_stop": {
+                "type": "stop",
+                "stopwords": "_russian_",
+            },
+            "russian_stemmer": {
+                "type": "stemmer",
+                "language": "russian",
+            },
+            "english_stop": {
+                "type": "stop",
+                "stopwords": "_english_",
+            },
+            "english_stemmer": {
+                "type": "stemmer",
+                "language": "light_english",
+            },
+            "prefixes": {
+                "type": "edge_ngram",
+                "min_gram": 2,
+                "max_gram": 20,
+            },
+            "trigrams": {
+                "type": "ngram",
+                "min_gram": 3,
+                "max_gram": 3,
+            },
+        },
+        "normalizer": {
+            "lowercase": {
+                "type": "custom",
+                "filter": ["lowercase"],
+            }
+        },
+        "analyzer": {
+            # Both stemmers run on every token, each leaves the other
+            # alphabet alone.
+            "words": {
+                "tokenizer": "standard",
+                "filter": [
+                    "lowercase",
+                    "russian_stop",
+                    "russian_stemmer",
+                    "english_stop",
+                    "english_stemmer",
+                ],
+            },
+            "prefixes": {
+                "tokenizer": "standard",
+                "filter": [
+                    "lowercase",
+                    "prefixes",
+                ],
+            },
+            "trigrams": {
+                "tokenizer": "standard",
+                "filter": [
+                    "lowercase",
+                    "trigrams",
+                ],
+            },
+            "plain": {
+                "tokenizer": "standard",
+                "filter": ["lowercase"],
+            },
+        },
+    },
+}
+# Short fields get prefix and substring matching as plain term lookups,
+# long descriptions only the word analyzer.
+SHORT_TEXT = {
+    "type": "text",
+    "analyzer": "words",
+    "fields": {
+        "prefix": {
+            "type": "text",
+            "analyzer": "prefixes",
+            "search_analyzer": "plain",
+        },
+        "trigram": {
+            "type": "text",
+            "analyzer": "trigrams",
+        },
+    },
+}
+LONG_TEXT = {"type": "text", "analyzer": "words"}
+# Latin keys are not words of either language, so they are not stemmed.
+TRANSLIT_TEXT = {
+    **SHORT_TEXT,
+    "analyzer": "plain",
+}
+CAFES_MAPPINGS = {
+    "_meta": {
+        "mapping_version": CAFES_MAPPING_VERSION
+    },
+    "properties": {
+        "name": SHORT_TEXT,
+        "name_ru": SHORT_TEXT,
+        "address": SHORT_TEXT,
+        # latin_key of the name, name_ru and address together.
+        "translit": TRANSLIT_TEXT,
+        "id": {"type": "keyword"},
+        # English and Russian names of the city, either may be asked for.
+        "city": {
+            "type": "keyword",
+            "normalizer": "lowercase",
+        },
+        "location": {"type": "geo_point"},
+        # What search responses are built from, stored but not indexed.
+        "display": {
+            "type": "object",
+            "enabled": False,
+        },
+        "content_hash": {
+            "type": "keyword",
+            "index": False,
+        },
+        "location_description": LONG_TEXT,
+        "interior_description": LONG_TEXT,
+        "menu_description": LONG_TEXT,
+        "place_history": LONG_TEXT,
+        "arbitrary_description": LONG_TEXT,
+    },
+}
+SEARCH_FIELDS = [
+    "name^4",
+    "name.prefix^3",
+    "name.trigram",
+    "name_ru^4",
+    "name_ru.prefix^3",
+    "name_ru.trigram",
+    "address^2",
+    "address.prefix^1.5",
+    "address.trigram^0.5",
+    "location_description",
+    "interior_description",
+    "menu_description",
+    "place_history",
+    "arbitrary_description",
+]
+# Searched with the latin_key of the query.
+TRANSLIT_SEARCH_FIELDS = [
+    "translit^2",
+    "translit.prefix^1.5",
+    "translit.trigram^0.5",
+]
+# The same fields and boosts for the in-process index, which has no
+# subfields of its own.
+LOCAL_SEARCH_FIELDS = {
+    "name": 4,
+    "name_ru": 4,
+    "address": 2,
+    "translit": 2,
+    **dict.fromkeys(DESCRIPTION_FIELDS, 1),
+}
+
+
+def build_search_query(
+    text: str,
+    city: str = "",
+    latitude: float = 0,
+    longitude: float = 0,
+    radius: float = 0,
+):
+    """Relevance query narrowed to the city and radius, decaying with distance.
+
+    Without any words to match, every cafe does, so the nearest come first.
+    """
+    query = {
+        "bool": {
+            "should": [
+                {
+                    "multi_match": {
+                        "query": text,
+                        "type": "most_fields",
+                        "fields": SEARCH_FIELDS,
+                    }
+                },
+                {
+                    "multi_match": {
+                        "query": latin_key(text),
+                        "type": "most_fields",
+                        "fields": TRANSLIT_SEARCH_FIELDS,
+                    }
+                },
+            ],
+            "minimum_should_match": 1,
+        }
+    }
+    if not text.split():
+        query = {"match_all": {}}
+    filters = []
+    if city:
+        filters.append({"term": {"city": city}})
+    if not (latitude and longitude):
+        return {
+            "bool": {
+                "must": query,
+                "filter": filters,
+            }
+        }
+
+    origin = {"lat": latitude, "lon": longitude}
+    if radius > 0:
+        filters.append(
+            {
+                "geo_distance": {
+                    "distance": f"{radius}km",
+                    "location": origin,
+                }
+            }
+        )
+    return {
+        "function_score": {
+            "query": {
+                "bool": {
+                    "must": query,
+                    "filter": filters,
+                }
+            },
+            "functions": [
+                {
+                    "gauss": {
+                        "location": {
+                            "origin": origin,
+                            "scale": f"{settings.SEARCH_DISTANCE_SCALE}km",
+                        }
+                    }
+                }
+            ],
+            "boost_mode": "multiply",
+        }
+    }
+
+
+es = AsyncElasticsearch(
+    hosts=[
+        "http://elasticsearch-geoprocessor:9200"
+    ]
+)
+local_index = InvertedIndex(LOCAL_SEARCH_FIELDS)
+
+
+def local_index_enabled() -> bool:
+    return (
+        settings.SEARCH_ENGINE == "local"
+        or settings.SEARCH_FALLBACK_TIMEOUT > 0
+    )
+
+
+def search_local_index(
+    text: str,
+    limit: int,
+    city: str = "",
+    latitude: float = 0,
+    longitude: float = 0,
+    radius: float = 0,
+):
+    """What build_search_query asks of Elasticsearch, answered in process."""
+    scores = (
+        local_index.search(
+            f"{text} {latin_key(text)}"
+        )
+        if text.split()
+        else dict.fromkeys(
+            local_index.documents, 1.0
+        )
+    )
+    documents = [
+        local_index.documents[cafe_id]
+        for cafe_id in scores
+    ]
+    if city:
+        city = city.lower()
+        documents = [
+            document
+            for document in documents
+            if city
+            in (
+                name.lower()
+                for name in document["city"]
+            )
+        ]
+    if latitude and longitude:
+        if radius > 0:
+            documents = [
+                document
+                for document in documents
+                if document["location"]
+            ]
+        located = [
+            document
+            for document in documents
+            if document["location"]
+        ]
+        distances = (
+            CoordinatesProcessor.distances_from(
+                latitude,
+                longitude,
+                [
+                    document["location"]["lat"]
+                    for document in located
+                ],
+                [
+                    document["location"]["lon"]
+                    for document in located
+                ],
+            )
+        )
+        decays = (
+            CoordinatesProcessor.gaussian_decay(
+                distances,
+                settings.SEARCH_DISTANCE_SCALE,
+            )
+        )
+        too_far = set()
+        for document, distance, decay in zip(
+            located, distances, decays
+        ):
+            if radius > 0 and distance > radius:
+                too_far.add(document["id"])
+            scores[document["id"]] *= float(decay)
+        documents = [
+            document
+            for document in documents
+            if document["id"] not in too_far
+        ]
+    documents.sort(
+        key=lambda document: (
+            -scores[document["id"]],
+            document["id"],
+        )
+    )
+    return [
+        (document["id"], document["display"])
+        for document in documents[:limit]
+    ]
+
+
+async def search_cafe_documents(
+    text: str,
+    limit: int,
+    city: str = "",
+    latitude: float = 0,
+    longitude: float = 0,
+    radius: float = 0,
+):
+    """(cafe_id, display) of the best matches, best first.
+
+    Elasticsearch answers unless SEARCH_ENGINE is "local". When it fails
+    or takes longer than SEARCH_FALLBACK_TIMEOUT, the local index answers
+    instead.
+    """
+    if settings.SEARCH_ENGINE == "local":
+        return search_local_index(
+            text,
+            limit,
+            city,
+            latitude,
+            longitude,
+            radius,
+        )
+    search = es.search(
+        index=CAFES_INDEX,
+        query=build_search_query(
+            text,
+            city,
+            latitude,
+            longitude,
+            radius,
+        ),
+        size=limit,
+        source=["display"],
+    )
+    if settings.SEARCH_FALLBACK_TIMEOUT <= 0:
+        response = await search
+    else:
+        try:
+            response = await asyncio.wait_for(
+                search,
+                settings.SEARCH_FALLBACK_TIMEOUT,
+            )
+        except (
+            asyncio.TimeoutError,
+            elasticsearch.ApiError,
+            elasticsearch.TransportError,
+        ) as e:
+            logging.error(
+                f"Elasticsearch search failed, answering from the local index: {e!r}"
+            )
+            return search_local_index(
+                text,
+                limit,
+                city,
+                latitude,
+                longitude,
+                radius,
+            )
+    return [
+        (
+            hit["_id"],
+            hit["_source"].get("display"),
+        )
+        for hit in response["hits"]["hits"]
+    ]
+
+
+async def iter_elasticsearch_hashes():
+    """(id, content_hash) of every indexed cafe, ordered by id.
+
+    Pages through a point in time, so documents written meanwhile neither
+    shift nor repeat pages.
+    """
+    pit_id = (
+        await es.open_point_in_time(
+            index=CAFES_INDEX, keep_alive="1m"
+        )
+    )["id"]
+    search_after = None
+    try:
+        while True:
+            response = await es.search(
+                pit={
+                    "id": pit_id,
+                    "keep_alive": "1m",
+                },
+                size=settings.ES_BULK_CHUNK_SIZE,
+                sort=[{"id": "asc"}],
+                source=False,
+                docvalue_fields=["content_hash"],
+                search_after=search_after,
+                track_total_hits=False,
+            )
+            pit_id = response["pit_id"]
+            hits = response["hits"]["hits"]
+            if not hits:
+                return
+            for hit in hits:
+                yield hit["_id"], hit.get(
+                    "fields", {}
+                ).get("content_hash", [None])[0]
+            search_after = hits[-1]["sort"]
+    finally:
+        await es.close_point_in_time(id=pit_id)
+
+
+async def sync_cafes_to_elasticsearch(
+    session_factory,
+):
+    """Reindex cafes whose documents are missing or outdated, drop orphans.
+
+    Both sides are streamed in id order and merged, so memory holds only
+    the ids that need work.
+    """
+    outdated = []
+    indexed = iter_elasticsearch_hashes()
+    current = await anext(indexed, None)
+    async with session_factory() as session:
+        async for (
+            row
+        ) in models.Cafe.stream_documents(
+            session, settings.ES_BULK_CHUNK_SIZE
+        ):
+            while current and current[0] < row.id:
+                outdated.append(current[0])
+                current = await anext(
+                    indexed, None
+                )
+            if current and current[0] == row.id:
+                document = cafe_document(row)
+                if (
+                    current[1]
+                    != document["content_hash"]
+                ):
+                    outdated.append(row.id)
+                current = await anext(
+                    indexed, None
+                )
+            else:
+                outdated.append(row.id)
+    while current:
+        outdated.append(current[0])
+        current = await anext(indexed, None)
+
+    # Orphans come out of index_cafes as deletes.
+    await index_cafes(session_factory, outdated)
+
+    print("Synchronization complete.")
+
+
+def content_hash(document) -> str:
+    return hashlib.blake2b(
+        json.dumps(
+            document,
+            sort_keys=True,
+            ensure_ascii=False,
+        ).encode(),
+        digest_size=16,
+    ).hexdigest()
+
+
+def cafe_documents(rows) -> list:
+    """Documents of many cafes, their texts cleaned in one batch."""
+    cleaned = iter(
+        clean_strings(
+            getattr(row, field)
+            for row in rows
+            for field in TEXT_FIELDS
+        )
+    )
+    documents = []
+    for row in rows:
+        texts = {
+            field: next(cleaned)
+            for field in TEXT_FIELDS
+        }
+        document = {
+            "id": row.id,
+            "name": texts["name"],
+            "name_ru": texts["name_ru"],
+            "address": texts["address"],
+            "city": [
+                city
+                for city in (
+                    row.city,
+                    row.city_ru,
+                )
+                if city
+            ],
+            "location": (
+                {
+                    "lat": float(row.latitude),
+                    "lon": float(row.longitude),
+                }
+                if row.latitude is not None
+                else None
+            ),
+            "display": (
+                asdict(CafeView.from_row(row))
+                if row.latitude is not None
+                else None
+            ),
+        }
+        document["translit"] = latin_key(
+            " ".join(
+                document[field]
+                for field in SUGGEST_FIELDS
+            )
+        )
+        for field in DESCRIPTION_FIELDS:
+            document[field] = (
+                texts[field]
+                if row.description_id
+                else None
+            )
+        document["content_hash"] = content_hash(
+            document
+        )
+        documents.append(document)
+    return documents
+
+
+def cafe_document(row):
+    return cafe_documents([row])[0]
+
+
+def cafe_suggestions(row, document):
+    """SuggestionIndex.upsert arguments for a cafe and its document."""
+    return (
+        row.id,
+        {
+            field: (
+                getattr(row, field),
+                document[field],
+            )
+            for field in SUGGEST_FIELDS
+        },
+        document["city"],
+        document["location"],
+    )
+
+
+async def cafe_actions(
+    session_factory,
+    cafe_ids: List[str],
+    index: str = CAFES_INDEX,
+):
+    """Bulk actions for `cafe_ids`: index those in Postgres, delete the rest.
+
+    Documents are loaded one chunk at a time with a single query, so
+    memory and connection use stay flat however many ids are passed.
+    """
+    chunk_size = settings.ES_BULK_CHUNK_SIZE
+    for start in range(
+        0, len(cafe_ids), chunk_size
+    ):
+        chunk = cafe_ids[
+            start : start + chunk_size
+        ]
+        async with session_factory() as session:
+            rows = (
+                await models.Cafe.get_documents(
+                    session, chunk
+                )
+            )
+        found = set()
+        for row, document in zip(
+            rows, cafe_documents(rows)
+        ):
+            found.add(row.id)
+            if local_index_enabled():
+                local_index.upsert(document)
+            suggestion_index.upsert(
+                *cafe_suggestions(row, document)
+            )
+            yield {
+                "_op_type": "index",
+                "_index": index,
+                "_id": row.id,
+                "_source": document,
+            }
+        for cafe_id in chunk:
+            if cafe_id not in found:
+                if local_index_enabled():
+                    local_index.remove(cafe_id)
+                suggestion_index.remove(cafe_id)
+                yield {
+                    "_op_type": "delete",
+                    "_index": index,
+                    "_id": cafe_id,
+                }
+
+
+async def bulk(actions, **kwargs):
+    """Stream `actions` to Elasticsearch, returning (done, failed ids)."""
+    done, failed = 0, []
+    async for ok, item in async_streaming_bulk(
+        es,
+        actions,
+        chunk_size=settings.ES_BULK_CHUNK_SIZE,
+        max_retries=3,
+        raise_on_error=False,
+        raise_on_exception=False,
+        **kwargs,
+    ):
+        operation, result = next(
+            iter(item.items())
+        )
+        # Deleting what is already gone is fine.
+        if ok or (
+            operation == "delete"
+            and result.get("status") == 404
+        ):
+            done += 1
+            continue
+        failed.append(result.get("_id"))
+        logging.error(
+            f"Failed to {operation} cafe {result.get('_id')}: {result.get('error')}"
+        )
+    return done, failed
+
+
+async def index_cafes(
+    session_factory,
+    cafe_ids,
+    index: str = CAFES_INDEX,
+    send: bool = True,
+    **kwargs,
+) -> List[str]:
+    """Bring the documents of `cafe_ids` in line with Postgres.
+
+    Ids are split between ES_BULK_CONCURRENCY streaming bulk workers, each
+    holding at most one database session at a time. Without `send` only
+    the in-process indices are updated. `kwargs` go to the bulk requests.
+    Returns the ids Elasticsearch did not accept.
+    """
+    cafe_ids = sorted(cafe_ids)
+    if not cafe_ids:
+        return []
+    if (
+        not send
+        or settings.SEARCH_ENGINE == "local"
+    ):
+        # Only the local indices are kept, the actions go nowhere.
+        async for _ in cafe_actions(
+            session_factory, cafe_ids, index
+        ):
+            pass
+        return []
+    workers = max(settings.ES_BULK_CONCURRENCY, 1)
+    results = await asyncio.gather(
+        *[
+            bulk(
+                cafe_actions(
+                    session_factory,
+                    cafe_ids[worker::workers],
+                    index,
+                ),
+                **kwargs,
+            )
+            for worker in range(workers)
+        ]
+    )
+    failed = sorted(
+        cafe_id
+        for _, worker_failed in results
+        for cafe_id in worker_failed
+    )
+    logging.info(
+        f"Bulk synced {sum(done for done, _ in results)} cafes, {len(failed)} failed."
+    )
+    return failed
+
+
+async def live_mapping_version():
+    try:
+        mappings = await es.indices.get_mapping(
+            index=CAFES_INDEX
+        )
+    except elasticsearch.NotFoundError:
+        return None
+    return (
+        next(iter(mappings.values()))["mappings"]
+        .get("_meta", {})
+        .get("mapping_version")
+    )
+
+
+async def rebuild_cafes_index(session_factory):
+    """Build a fresh index off to the side and swap the alias onto it.
+
+    Searches keep hitting the previous index until the swap, which
+    happens in a single atomic alias update.
+    """
+    index = (
+        f"{CAFES_INDEX}_v{CAFES_MAPPING_VERSION}"
+    )
+    # Left over from an interrupted build, it was never live.
+    await es.indices.delete(
+        index=index, ignore_unavailable=True
+    )
+    await es.indices.create(
+        index=index,
+        settings={
+            **CAFES_SETTINGS,
+            "number_of_replicas": 0,
+            "refresh_interval": "-1",
+        },
+        mappings=CAFES_MAPPINGS,
+    )
+    async with session_factory() as session:
+        cafe_ids = await models.Cafe.get_ids(
+            session
+        )
+    await index_cafes(
+        session_factory, cafe_ids, index
+    )
+    await es.indices.put_settings(
+        index=index,
+        settings={
+            "number_of_replicas": CAFES_SETTINGS[
+                "number_of_replicas"
+            ],
+            "refresh_interval": None,
+        },
+    )
+    await es.indices.refresh(index=index)
+
+    try:
+        previous = list(
+            await es.indices.get_alias(
+                name=CAFES_INDEX
+            )
+        )
+    except elasticsearch.NotFoundError:
+        previous = []
+    actions = [
+        {
+            "add": {
+                "index": index,
+                "alias": CAFES_INDEX,
+            }
+        }
+    ]
+    if not previous and await es.indices.exists(
+        index=CAFES_INDEX
+    ):
+        # A concrete index from before aliases took its name.
+        actions.append(
+            {
+                "remove_index": {
+                    "index": CAFES_INDEX
+                }
+            }
+        )
+    await es.indices.update_aliases(
+        actions=actions
+        + [
+            {
+                "remove": {
+                    "index": old,
+                    "alias": CAFES_INDEX,
+                }
+            }
+            for old in previous
+            if old != index
+        ]
+    )
+    for old in previous:
+        if old != index:
+            await es.indices.delete(
+                index=old, ignore_unavailable=True
+            )
+    logging.info(
+        f"Alias {CAFES_INDEX} now points to {index}."
+    )
+
+
+async def load_local_indices(session_factory):
+    """Fill the suggestion index, and the local search index if used."""
+    async with session_factory() as session:
+        rows = [
+            row
+            async for row in models.Cafe.stream_documents(
+                session,
+                settings.ES_BULK_CHUNK_SIZE,
+            )
+        ]
+    documents = cafe_documents(rows)
+    suggestions = [
+        cafe_suggestions(row, document)
+        for row, document in zip(rows, documents)
+    ]
+    # Built in one go, so requests never see them half done.
+    suggestion_index.build(suggestions)
+    if local_index_enabled():
+        local_index.build(documents)
+    logging.info(
+        f"Local indices built with {len(suggestions)} cafes."
+    )
+
+
+async def refresh_elasticsearch_cafes():
+    live_version = await live_mapping_version()
+    # A newer release may already have moved the alias forward, leave it.
+    if (
+        live_version is None
+        or live_version < CAFES_MAPPING_VERSION
+    ):
+        await rebuild_cafes_index(
+            sessionmanager.session
+        )
+
+    # Catches up with whatever changed while the index was built.
+    await sync_cafes_to_elasticsearch(
+        sessionmanager.session
+    )
@@ -1,23 +1,52 @@
 import asyncio
 import logging
-import pickle
-import re
+import time
+from datetime import datetime, timedelta
 from typing import List
 
-import elasticsearch
-from elasticsearch import AsyncElasticsearch
+import grpc
+import msgpack
+import numpy as np
 from grpc import aio as grpc_aio
 from grpc_reflection.v1alpha import reflection
+from redis.exceptions import LockError
 
 from app import settings
+from app.cursors import (
+    decode_cursor,
+    encode_cursor,
+)
+from app.elastic import (
+    CAFES_MAPPING_VERSION,
+    index_cafes,
+    live_mapping_version,
+    load_local_indices,
+    refresh_elasticsearch_cafes,
+    search_cafe_documents,
+    sync_cafes_to_elasticsearch,
+)
+from app.suggestions import suggestion_index
 from db import models
 from db.main import sessionmanager
-from geoutils import CoordinatesProcessor
+from db.views import CAFE_VIEW_VERSION, CafeView
+from geoutils import (
+    CoordinatesProcessor,
+    SpatialIndex,
+    geohash,
+    rank_by_distance,
+)
 from proto import (
     main_service_pb2,
     main_service_pb2_grpc,
 )
-from utils import RedisWrapper
+from textutils.normalization import clean_string
+from utils import (
+    CacheControl,
+    CachePolicy,
+    LocalCache,
+    RedisWrapper,
+    SingleFlight,
+)
 
 logging.basicConfig(
     level=(
@@ -33,290 +62,556 @@ logging.basicConfig(
 #     # decode_responses=True,
 # )
 
-redis = RedisWrapper(settings.REDIS_URL)
-es = AsyncElasticsearch(
-    hosts=[
-        "http://elasticsearch-geoprocessor:9200"
-    ]
+redis = RedisWrapper(
+    settings.REDIS_URL,
+    LocalCache(
+        settings.LOCAL_CACHE_MAX_ITEMS,
+        settings.LOCAL_CACHE_MAX_BYTES,
+    ),
+    lock_timeout=settings.CACHE_LOCK_TIMEOUT,
 )
 
 sessionmanager.init(settings.POSTGRES_URL)
 
+general_cache = CachePolicy(
+    settings.CACHE_GENERAL_TTL,
+    settings.CACHE_GENERAL_STALE_TTL,
+    settings.CACHE_TTL_JITTER,
+)
+query_cache = CachePolicy(
+    settings.CACHE_QUERY_TTL,
+    settings.CACHE_QUERY_STALE_TTL,
+    settings.CACHE_TTL_JITTER,
+)
+cafe_cache = CachePolicy(
+    settings.CACHE_CAFE_TTL,
+    settings.CACHE_CAFE_STALE_TTL,
+    settings.CACHE_TTL_JITTER,
+)
+
+# Every key family carries a generation, bumped to invalidate it at once.
+CACHE_NAMESPACES = (
+    "cafes:cell",
+    "cafes:full",
+    "cafes:query",
+)
+
+spatial_index = SpatialIndex()
+flights = SingleFlight()
+
 global_times = []
 
 
-async def clean_string(input_string):
-    # Use a regular expression to replace non-letter and non-digit characters with a space
-    cleaned_string = re.sub(
-        r"[^a-zA-Zа-яА-Я\d\- ]",
-        "",
-        input_string or "",
+def serialize_cafe(
+    cafe_view: CafeView, distance: float
+):
+    logging.debug(
+        f"Calculated distance: {distance}"
     )
-    # Convert to lowercase for uniformity
-    cleaned_string = cleaned_string.lower()
-    return cleaned_string
+    cafe = {
+        "name": cafe_view.name,
+        "address": cafe_view.address,
+        "distance": distance,
+        "latitude": cafe_view.latitude,
+        "longitude": cafe_view.longitude,
+        "website": cafe_view.website,
+        "roaster": cafe_view.roaster,
+        "description": cafe_view.description,
+    }
+    return cafe
 
 
-async def fetch_cafe_ids_postgres(session):
-    # Assuming `models.Cafe.get_ids(session)` fetches all cafe IDs from PostgreSQL
-    return set(await models.Cafe.get_ids(session))
+async def refresh_spatial_index():
+    # Concurrent first requests on a cold replica share one rebuild.
+    await flights.do(
+        "spatial_index", rebuild_spatial_index
+    )
 
 
-async def fetch_cafe_ids_elasticsearch():
-    es_result = await es.search(
-        index="cafes",
-        body={
-            "size": 1000,
-            "_source": ["id"],
-            "query": {"match_all": {}},
-        },
+async def rebuild_spatial_index():
+    async with sessionmanager.session() as session:
+        rows = (
+            await models.Geodata.get_coordinates(
+                session
+            )
+        )
+    await asyncio.to_thread(
+        spatial_index.build, rows
+    )
+    logging.info(
+        f"Spatial index rebuilt with {len(spatial_index)} cafes."
     )
-    return {
-        hit["_source"]["id"]
-        for hit in es_result["hits"]["hits"]
-    }
 
 
-async def sync_cafes_to_elasticsearch(
-    session_factory,
-):
-    # Using session_factory to manage sessions within subtasks
-    async with session_factory() as session:
-        postgres_cafe_ids = (
-            await fetch_cafe_ids_postgres(session)
+async def update_spatial_index(rows, removed):
+    # Let a full rebuild that read older rows finish first, so it cannot
+    # overwrite this update, then hold its key so none starts meanwhile.
+    while "spatial_index" in flights:
+        await refresh_spatial_index()
+    await flights.do(
+        "spatial_index",
+        lambda: asyncio.to_thread(
+            spatial_index.update,
+            rows,
+            removed=removed,
+        ),
+    )
+
+
+async def maintain_spatial_index():
+    while True:
+        await asyncio.sleep(
+            settings.SPATIAL_INDEX_REFRESH_INTERVAL
         )
-        elasticsearch_cafe_ids = (
-            await fetch_cafe_ids_elasticsearch()
+        try:
+            await refresh_spatial_index()
+        except Exception as e:
+            logging.error(
+                f"Failed to refresh spatial index: {e}"
+            )
+
+
+async def report_cache_stats():
+    while True:
+        await asyncio.sleep(
+            settings.CACHE_STATS_INTERVAL
+        )
+        logging.info(
+            f"Local cache stats: {redis.stats()}"
         )
 
-    to_add_to_es = (
-        postgres_cafe_ids - elasticsearch_cafe_ids
-    )
-    to_remove_from_es = (
-        elasticsearch_cafe_ids - postgres_cafe_ids
-    )
-    await asyncio.gather(
-        *[
-            add_cafe_to_elasticsearch(
-                session_factory, cafe_id
+
+async def apply_cafe_changes(
+    low: int, leading: bool = True
+) -> int:
+    """Apply changes of transactions finished since the `low` watermark.
+
+    Returns the watermark to continue from. Cafes are reloaded as they
+    are now, so applying a change twice is harmless. In-process indices
+    are updated on every replica, Elasticsearch and the cafe views only
+    by the `leading` one.
+    """
+    async with sessionmanager.session() as session:
+        high = (
+            await models.CafeChange.get_watermark(
+                session
             )
-            for cafe_id in to_add_to_es
-        ],
-        *[
-            delete_cafe_from_elasticsearch(
-                cafe_id
+        )
+        changes = (
+            await models.CafeChange.get_between(
+                session, low, high
             )
-            for cafe_id in to_remove_from_es
-        ],
+        )
+        if not changes:
+            return high
+        cafe_ids = list(
+            dict.fromkeys(
+                change.cafe_id
+                for change in changes
+            )
+        )
+        rows = (
+            await models.Geodata.get_coordinates(
+                session, cafe_ids
+            )
+        )
+    relocated = any(
+        change.source in ("cafes", "geodatas")
+        for change in changes
+    )
+    logging.info(
+        f"Applying {len(changes)} changes to {len(cafe_ids)} cafes."
     )
 
-    print("Synchronization complete.")
-
-
-async def add_cafe_to_elasticsearch(
-    session_factory, cafe_id
-):
-    async with session_factory() as session:
-        cafe_data = await serialize_cafe_data(
-            session, cafe_id
+    # Searchable before the caches below are invalidated, or a search
+    # in between would cache the old hits under the new generation.
+    failed = await index_cafes(
+        sessionmanager.session,
+        cafe_ids,
+        send=leading,
+        refresh="wait_for",
+    )
+    if failed:
+        # Keeps the watermark where it is, the batch is retried whole.
+        raise RuntimeError(
+            f"Elasticsearch rejected cafes {failed}"
         )
-    if cafe_data:
-        await es.index(
-            index="cafes",
-            id=cafe_id,
-            document=cafe_data,
+    if relocated and len(spatial_index):
+        located = {row[2] for row in rows}
+        await update_spatial_index(
+            rows,
+            [
+                cafe_id
+                for cafe_id in cafe_ids
+                if cafe_id not in located
+            ],
+        )
+    if leading:
+        await invalidate_cafes(cafe_ids)
+    # Cells, and local search results, are cached from whichever
+    # replica's in-process indices answered, so each replica drops them
+    # again once its own indices are updated.
+    namespaces = []
+    if (
+        leading
+        or settings.SEARCH_ENGINE == "local"
+    ):
+        namespaces.append("cafes:query")
+    if relocated:
+        namespaces.append("cafes:cell")
+    if namespaces:
+        await redis.invalidate(*namespaces)
+    return high
+
+
+async def prune_cafe_changes():
+    async with sessionmanager.session() as session:
+        await models.CafeChange.prune(
+            session,
+            datetime.now()
+            - timedelta(
+                seconds=settings.CAFE_CHANGES_RETENTION
+            ),
         )
 
 
-async def delete_cafe_from_elasticsearch(cafe_id):
-    await es.delete(index="cafes", id=cafe_id)
+async def hold_lease(lock) -> bool:
+    """Whether this replica holds `lock`, renewing it or taking it over."""
+    try:
+        if await lock.owned():
+            await lock.reacquire()
+            return True
+    except LockError:
+        pass
+    return await lock.acquire(blocking=False)
+
+
+async def take_over_cafe_changes():
+    """Redo what a previous leader may have left half done.
+
+    Changes this replica followed before taking over were applied to its
+    own indices only.
+    """
+    if settings.SEARCH_ENGINE != "local":
+        await sync_cafes_to_elasticsearch(
+            sessionmanager.session
+        )
+    await redis.invalidate(
+        "cafes:full", "cafes:query", "cafes:cell"
+    )
 
 
-async def serialize_cafe_data(session, cafe_id):
-    cafe = await models.Cafe.get_full(
-        session, cafe_id
-    )
-    if not cafe:
-        return None
+async def follow_cafe_changes(low: int):
+    """Keep the search indices, the spatial index and caches in step with cafe_changes.
 
-    res = {
-        "id": cafe_id,
-        "name": await clean_string(
-            cafe.company.name
-        ),
-        "name_ru": await clean_string(
-            cafe.company.name_ru
-        ),
-        "address": await clean_string(
-            cafe.geodata.address
-        ),
-        "location_description": (
-            await clean_string(
-                cafe.description.location_description
+    Woken by the NOTIFY sent from the capture triggers, and polled anyway
+    in case a notification is lost. Every replica updates its in-process
+    indices and drops what was cached from them, while Elasticsearch,
+    the cafe views and pruning are left to the one holding the leader
+    lease.
+    """
+    changed = asyncio.Event()
+    lease = redis.r.lock(
+        "lock:cafe_changes:leader",
+        timeout=settings.CAFE_CHANGES_LEASE_TTL,
+    )
+    led = None
+    pruned_at = 0
+    while True:
+        try:
+            async with sessionmanager.listen(
+                "cafe_changes",
+                lambda *_: changed.set(),
+            ):
+                while True:
+                    changed.clear()
+                    leading = await hold_lease(
+                        lease
+                    )
+                    renewal = (
+                        asyncio.create_task(
+                            renew_lock(lease)
+                        )
+                        if leading
+                        else None
+                    )
+                    try:
+                        if (
+                            leading
+                            and led is False
+                        ):
+                            logging.info(
+                                "Took over cafe changes."
+                            )
+                            await take_over_cafe_changes()
+                        led = leading
+                        low = await apply_cafe_changes(
+                            low, leading
+                        )
+                        if (
+                            leading
+                            and time.monotonic()
+                            - pruned_at
+                            > 3600
+                        ):
+                            await prune_cafe_changes()
+                            pruned_at = (
+                                time.monotonic()
+                            )
+                    finally:
+                        if renewal is not None:
+                            renewal.cancel()
+                    try:
+                        await asyncio.wait_for(
+                            changed.wait(),
+                            settings.CAFE_CHANGES_POLL_INTERVAL,
+                        )
+                    except asyncio.TimeoutError:
+                        pass
+        except Exception as e:
+            logging.error(
+                f"Failed to apply cafe changes: {e}"
             )
-            if cafe.description
-            else None
-        ),
-        "interior_description": (
-            await clean_string(
-                cafe.description.interior_description
+            await asyncio.sleep(
+                settings.CAFE_CHANGES_POLL_INTERVAL
             )
-            if cafe.description
-            else None
-        ),
-        "menu_description": (
-            await clean_string(
-                cafe.description.menu_description
+
+
+async def renew_lock(lock):
+    """Keep `lock` from expiring until cancelled."""
+    while True:
+        await asyncio.sleep(lock.timeout / 3)
+        try:
+            await lock.reacquire()
+        except LockError as e:
+            logging.error(
+                f"Lost lock {lock.name}: {e}"
             )
-            if cafe.description
-            else None
-        ),
-        "place_history": (
-            await clean_string(
-                cafe.description.place_history
+            return
+
+
+async def refresh_elasticsearch_once():
+    """Refresh Elasticsearch from one replica at a time.
+
+    The lock is renewed for as long as the refresh runs, however large
+    the corpus. Replicas that waited for it skip the refresh when the
+    alias already points at the current mapping version, the holder has
+    just synced it.
+    """
+    lock = redis.r.lock(
+        "lock:elasticsearch:refresh",
+        timeout=settings.ES_REFRESH_LOCK_TIMEOUT,
+        blocking_timeout=settings.ES_REFRESH_LOCK_WAIT,
+    )
+    waited = not await lock.acquire(
+        blocking=False
+    )
+    if waited and not await lock.acquire():
+        logging.error(
+            "Gave up waiting for the Elasticsearch refresh, serving the index as is."
+        )
+        return
+    renewal = asyncio.create_task(
+        renew_lock(lock)
+    )
+    try:
+        if (
+            waited
+            and (
+                await live_mapping_version() or 0
             )
-            if cafe.description
-            else None
-        ),
-        "arbitrary_description": (
-            await clean_string(
-                cafe.description.arbitrary_description
+            >= CAFES_MAPPING_VERSION
+        ):
+            logging.info(
+                "Elasticsearch already refreshed by another replica."
             )
-            if cafe.description
+            return
+        await refresh_elasticsearch_cafes()
+    finally:
+        renewal.cancel()
+        try:
+            await lock.release()
+        except LockError:
+            # Expired while refreshing, someone else may own it now.
+            pass
+
+
+def cache_control(request) -> CacheControl:
+    return CacheControl(
+        bypass=request.bypass_cache,
+        max_staleness=(
+            request.max_staleness
+            if request.HasField("max_staleness")
             else None
         ),
-    }
-    return res
+    )
 
 
-async def serialize_cafe(
-    cafe_model: models.Cafe, user_lat, user_lon
+async def fetch_nearest_via_cell(
+    lat,
+    lon,
+    limit,
+    radius=None,
+    control: CacheControl = CacheControl(),
 ):
-    distance = (
-        await CoordinatesProcessor.coordinates_to_distance(
-            user_lat,
-            user_lon,
-            cafe_model.geodata.latitude,
-            cafe_model.geodata.longitude,
-        )
-        if user_lat and user_lon
-        else 0
+    """The `limit` closest cafes, ranked from a candidate set shared per geohash cell.
+
+    Every user in the cell reuses the same cached candidates, distances are
+    still computed from their own coordinates.
+    """
+    cell = geohash.encode(
+        lat, lon, settings.GEOHASH_PRECISION
     )
 
-    logging.debug(
-        f"Calculated distance: {distance}"
+    async def load():
+        if not len(spatial_index):
+            await refresh_spatial_index()
+        ids, lats, lons = await asyncio.to_thread(
+            spatial_index.cover,
+            geohash.bounds(cell),
+            limit,
+        )
+        return msgpack.packb(
+            [
+                ids.tolist(),
+                lats.tolist(),
+                lons.tolist(),
+            ]
+        )
+
+    generation = await redis.generation(
+        "cafes:cell"
     )
-    cafe = {
-        "name": cafe_model.company.name_ru,
-        "address": cafe_model.geodata.address,
-        "distance": distance,
-        "latitude": cafe_model.geodata.latitude,
-        "longitude": cafe_model.geodata.longitude,
-        "website": cafe_model.company.website,
-        "roaster": (
-            {
-                "name": cafe_model.roaster.name,
-                "website": cafe_model.roaster.website,
-            }
-            if cafe_model.roaster
-            else {}
-        ),
-        "description": (
-            {
-                "location_description": cafe_model.description.location_description,
-                "interior_description": cafe_model.description.interior_description,
-                "menu_description": cafe_model.description.menu_description,
-                "place_history": cafe_model.description.place_history,
-                "arbitrary_description": cafe_model.description.arbitrary_description,
-                "image_uuid": cafe_model.description.image_uuid,
-            }
-            if cafe_model.description
-            else {}
+    ids, lats, lons = msgpack.unpackb(
+        await redis.get_or_set(
+            f"cafes:cell:g{generation}:{cell}:{limit}",
+            load,
+            general_cache,
+            control,
+        )
+    )
+    if not ids:
+        return []
+    return rank_by_distance(
+        CoordinatesProcessor.distances_from(
+            lat, lon, lats, lons
         ),
-    }
-    return cafe
+        np.array(ids, dtype=str),
+        limit,
+        radius=radius,
+    )
 
 
-async def refresh_elasticsearch_cafes():
-    try:
-        await es.delete_by_query(
-            index="cafes", query={"match_all": {}}
-        )
-    except elasticsearch.NotFoundError:
-        index_body = {
-            "settings": {
-                "number_of_shards": 1,
-                "number_of_replicas": 1,
-            },
-            "mappings": {
-                "properties": {
-                    "name": {"type": "text"},
-                    "name_ru": {"type": "text"},
-                    "address": {"type": "text"},
-                    "id": {"type": "text"},
-                    "location_description": {
-                        "type": "text"
-                    },
-                    "interior_description": {
-                        "type": "text"
-                    },
-                    "menu_description": {
-                        "type": "text"
-                    },
-                    "place_history": {
-                        "type": "text"
-                    },
-                    "arbitrary_description": {
-                        "type": "text"
-                    },
-                }
-            },
-        }
-        await es.indices.create(
-            index="cafes", body=index_body
+def search_cache_key(
+    generation: int,
+    text: str,
+    city: str,
+    limit: int,
+    cell: str,
+    radius: float,
+) -> str:
+    """Same key for queries differing only in case, spacing or word order."""
+    tokens = " ".join(sorted(set(text.split())))
+    return f"cafes:query:g{generation}:{tokens}:{city.lower()}:{limit}:{cell}:{radius}"
+
+
+def filter_by_distance(
+    cafes: List[CafeView],
+    latitude: float,
+    longitude: float,
+    radius: float,
+) -> List[tuple]:
+    """(cafe, distance) pairs within `radius`, or all of them if it is 0."""
+    distances = (
+        CoordinatesProcessor.distances_from(
+            latitude,
+            longitude,
+            [cafe.latitude for cafe in cafes],
+            [cafe.longitude for cafe in cafes],
         )
-
-    await sync_cafes_to_elasticsearch(
-        sessionmanager.session
+        if latitude and longitude
+        else np.zeros(len(cafes))
     )
+    return [
+        (cafe, float(distance))
+        for cafe, distance in zip(
+            cafes, distances
+        )
+        if radius <= 0 or distance <= radius
+    ]
 
 
-async def fetch_cafe_details(
-    cafe_id: str, session_factory, r=None
-) -> dict:
-    # Create a new session for this task
-    async with session_factory() as session:
-        # Your existing logic to fetch cafe details
-        cache_key = f"cafes:full:{cafe_id}"
-        if redis:
-            if details_bytes := await r.get(
-                cache_key
-            ):
-                return pickle.loads(details_bytes)
-        cafe_details = await models.Cafe.get_full(
-            session, cafe_id
-        )
-        if redis:
-            await r.set(
-                cache_key,
-                pickle.dumps(cafe_details),
-                180,
-            )
-        return cafe_details
+def cafe_cache_key(
+    cafe_id: str, generation: int
+) -> str:
+    return f"cafes:full:v{CAFE_VIEW_VERSION}:g{generation}:{cafe_id}"
 
 
-async def fetch_multiple_cafes(
-    cafe_ids: List[str], session_factory, r=None
-):
-    closest_cafes = await asyncio.gather(
+async def invalidate_cafes(cafe_ids: List[str]):
+    """Drop the cached views of cafes."""
+    generation = await redis.generation(
+        "cafes:full"
+    )
+    await redis.invalidate_keys(
         *[
-            fetch_cafe_details(
-                cafe_id, session_factory, r
-            )
+            cafe_cache_key(cafe_id, generation)
             for cafe_id in cafe_ids
         ]
     )
-    return closest_cafes
+
+
+async def fetch_cafes(
+    cafe_ids: List[str],
+    control: CacheControl = CacheControl(),
+) -> List[CafeView]:
+    """Cafe views for `cafe_ids` in the same order, None where a cafe is gone."""
+    if not cafe_ids:
+        return []
+    generation = await redis.generation(
+        "cafes:full"
+    )
+    keys = [
+        cafe_cache_key(cafe_id, generation)
+        for cafe_id in cafe_ids
+    ]
+    ids_by_key = dict(zip(keys, cafe_ids))
+
+    # Opens its own session, stale entries are reloaded after the
+    # request that noticed them has already returned.
+    async def load(missing_keys):
+        async with sessionmanager.session() as session:
+            cafes = (
+                await models.Cafe.get_full_many(
+                    session,
+                    [
+                        ids_by_key[key]
+                        for key in missing_keys
+                    ],
+                )
+            )
+        return {
+            key: (
+                CafeView.from_model(
+                    cafe
+                ).to_bytes()
+                if cafe
+                else None
+            )
+            for key, cafe in zip(
+                missing_keys, cafes
+            )
+        }
+
+    return [
+        (
+            CafeView.from_bytes(cafe_bytes)
+            if cafe_bytes is not None
+            else None
+        )
+        for cafe_bytes in await redis.get_many_or_set(
+            keys, load, cafe_cache, control
+        )
+    ]
 
 
 class CafeServiceServicer(
@@ -329,178 +624,172 @@ class CafeServiceServicer(
         context,  # I don't have enough time to completely rewrite it.
     ):
         return_length = request.len or 10
+        after = None
+        if request.cursor:
+            try:
+                after = decode_cursor(
+                    request.cursor
+                )
+            except ValueError:
+                await context.abort(
+                    grpc.StatusCode.INVALID_ARGUMENT,
+                    "Malformed cursor.",
+                )
+        # Without a cursor fall back to page numbers, counted from zero.
+        offset = (
+            0
+            if after
+            else max(request.page, 0)
+            * return_length
+        )
         if request.drop_cache:
-            await redis.drop_cache("cafes")
+            await redis.invalidate(
+                *CACHE_NAMESPACES
+            )
             logging.info("Dropped cache.")
         logging.info(
             "Starting ListCafesPerCity method."
         )
         try:
-            response = (
-                main_service_pb2.ListCafesPerCityResponse()
+            return await self._list_cafes(
+                request,
+                return_length,
+                offset,
+                after,
+                cache_control(request),
             )
-            global_cache_key = f"cafes:general:{request.city},{round(request.latitude, 3)},{round(request.longitude, 3)}"
-            if response_bytes := await redis.get(
-                global_cache_key
-            ):
-                res = pickle.loads(response_bytes)
-                return res
-            async with sessionmanager.session() as session:
-                city = request.city or "Moscow"
-                logging.info(
-                    f"Fetching cafes for city: {city}"
-                )
-
-                city_cache_key = f"cafes:general:{request.city}"
-                if cafes_bytes := await redis.get(
-                    city_cache_key,
-                ):
-                    cafes_data = pickle.loads(
-                        cafes_bytes,
-                    )
-                else:
-                    # cafes_data = await models.Country.get_cafes(
-                    #     session, "Russia"
-                    # )
-                    cafes_data = await models.Country.get_all_cafes_regardless(
-                        session
-                    )
-                    await redis.set(
-                        city_cache_key,
-                        pickle.dumps(cafes_data),
-                        180,
-                    )
-
-                logging.debug(
-                    f"Queried Cafes Data: {cafes_data}"
-                )
-
-                user_lat = request.latitude
-                user_lon = request.longitude
-
-                distances = []
-                for cafe in cafes_data:
-                    lat, lon, cafe_id = cafe
-                    distance = await CoordinatesProcessor.coordinates_to_distance(
-                        user_lat,
-                        user_lon,
-                        lat,
-                        lon,
-                    )
-                    distances.append(
-                        (distance, cafe_id)
-                    )
-
-                distances.sort(key=lambda x: x[0])
-                closest_cafe_ids = [
-                    cafe_id
-                    for _, cafe_id in distances[
-                        :return_length
-                    ]
-                ]
-                closest_cafes = []
-                for cafe_id in closest_cafe_ids:
-                    full_cache_key = (
-                        f"cafes:full:{cafe_id}"
-                    )
-
-                    if cafe_bytes := await redis.get(
-                        full_cache_key
-                    ):
-                        closest_cafes.append(
-                            pickle.loads(
-                                cafe_bytes
-                            )
-                        )
-                        continue
-
-                    res = await models.Cafe.get_full(
-                        session, cafe_id
-                    )
-
-                    await redis.set(
-                        full_cache_key,
-                        pickle.dumps(res),
-                        270,
-                    )
-                    closest_cafes.append(res)
-
-                logging.debug(
-                    f"Queried Cafes: {closest_cafes}"
-                )
-            logging.info(
-                "Successfully created ListCafesPerCityResponse."
+        except Exception as e:
+            logging.error(
+                f"An error occurred in ListCafesPerCity: {e}"
             )
+            raise
 
-            for cafe in closest_cafes:
-                cafe = await serialize_cafe(
-                    cafe,
+    async def _list_cafes(
+        self,
+        request,
+        return_length,
+        offset,
+        after,
+        control,
+    ):
+        response = (
+            main_service_pb2.ListCafesPerCityResponse()
+        )
+        city = request.city or "Moscow"
+        logging.info(
+            f"Fetching cafes for city: {city}"
+        )
+        radius = (
+            request.radius
+            if request.radius > 0
+            else None
+        )
+        if after is None:
+            # Responses themselves are not cached: they depend on the
+            # exact coordinates. Nearby users share the cell candidates.
+            closest = (
+                await fetch_nearest_via_cell(
                     request.latitude,
                     request.longitude,
+                    offset + return_length,
+                    radius,
+                    control,
                 )
-                description = cafe.get(
-                    "description"
+            )
+        else:
+            if not len(spatial_index):
+                await refresh_spatial_index()
+            closest = (
+                spatial_index.within(
+                    request.latitude,
+                    request.longitude,
+                    radius,
+                    return_length,
+                    after=after,
                 )
-                roaster = cafe.get("roaster")
-                cafe_obj = main_service_pb2.Cafe(
-                    name=cafe.get("name"),
-                    address=cafe.get("address"),
-                    distance=cafe.get("distance"),
-                    latitude=cafe.get("latitude"),
-                    roaster=(
-                        main_service_pb2.Roaster(
-                            name=roaster.get(
-                                "name"
-                            ),
-                            website=roaster.get(
-                                "website"
-                            ),
-                        )
-                        if roaster
-                        else None
-                    ),
-                    website=cafe.get("website"),
-                    longitude=cafe.get(
-                        "longitude"
-                    ),
-                    description=(
-                        main_service_pb2.Description(
-                            location_description=description.get(
-                                "location_description"
-                            ),
-                            interior_description=description.get(
-                                "interior_description"
-                            ),
-                            menu_description=description.get(
-                                "menu_description"
-                            ),
-                            place_history=description.get(
-                                "place_history"
-                            ),
-                            arbitrary_description=description.get(
-                                "arbitrary_description"
-                            ),
-                            image_uuid=description.get(
-                                "image_uuid"
-                            ),
-                        )
-                        if description
-                        else None
-                    ),
+                if radius
+                else spatial_index.nearest(
+                    request.latitude,
+                    request.longitude,
+                    return_length,
+                    after=after,
                 )
-                response.cafes.append(cafe_obj)
+            )
+        closest = closest[offset:]
+        if len(closest) == return_length:
+            response.next_cursor = encode_cursor(
+                *closest[-1]
+            )
+        closest_cafe_ids = [
+            cafe_id for _, cafe_id in closest
+        ]
+        closest_cafes = await fetch_cafes(
+            closest_cafe_ids, control
+        )
+
+        logging.debug(
+            f"Queried Cafes: {closest_cafes}"
+        )
+        logging.info(
+            "Successfully created ListCafesPerCityResponse."
+        )
 
-            await redis.set(
-                global_cache_key,
-                pickle.dumps(response),
-                120,
+        for (distance, _), cafe in zip(
+            closest, closest_cafes
+        ):
+            if cafe is None:
+                continue
+            cafe = serialize_cafe(
+                cafe,
+                distance,
             )
-            return response
-        except Exception as e:
-            logging.error(
-                f"An error occurred in ListCafesPerCity: {e}"
+            description = cafe.get("description")
+            roaster = cafe.get("roaster")
+            cafe_obj = main_service_pb2.Cafe(
+                name=cafe.get("name"),
+                address=cafe.get("address"),
+                distance=cafe.get("distance"),
+                latitude=cafe.get("latitude"),
+                roaster=(
+                    main_service_pb2.Roaster(
+                        name=roaster.get("name"),
+                        website=roaster.get(
+                            "website"
+                        ),
+                    )
+                    if roaster
+                    else None
+                ),
+                website=cafe.get("website"),
+                longitude=cafe.get("longitude"),
+                description=(
+                    main_service_pb2.Description(
+                        location_description=description.get(
+                            "location_description"
+                        ),
+                        interior_description=description.get(
+                            "interior_description"
+                        ),
+                        menu_description=description.get(
+                            "menu_description"
+                        ),
+                        place_history=description.get(
+                            "place_history"
+                        ),
+                        arbitrary_description=description.get(
+                            "arbitrary_description"
+                        ),
+                        image_uuid=description.get(
+                            "image_uuid"
+                        ),
+                    )
+                    if description
+                    else None
+                ),
             )
-            raise
+            response.cafes.append(cafe_obj)
+
+        return response
 
     async def SearchCafesByQueryPerCity(
         self, request, context
@@ -511,124 +800,219 @@ class CafeServiceServicer(
         logging.info(
             f"Searching cafes for query: {search_query} in city: {city}"
         )
-        global_cache_key = (
-            f"cafes:query:{search_query},{city}"
+        if request.drop_cache:
+            await redis.invalidate(
+                *CACHE_NAMESPACES
+            )
+            logging.info("Dropped cache.")
+        text = clean_string(search_query)
+        cell = (
+            geohash.encode(
+                request.latitude,
+                request.longitude,
+                settings.GEOHASH_PRECISION,
+            )
+            if request.latitude
+            and request.longitude
+            else ""
         )
-        if resp_bytes := await redis.get(
-            global_cache_key
-        ):
-            return pickle.loads(resp_bytes)
-
+        generation = await redis.generation(
+            "cafes:query"
+        )
+        control = cache_control(request)
         try:
-            tokens = (
-                await clean_string(search_query)
-            ).split(" ")
-            if settings.DEBUG:
-                print(tokens)
-            clauses = []
-            for token in tokens:
-                for field in [
-                    "name",
-                    "name_ru",
-                    "address",
-                    "location_description",
-                    "interior_description",
-                    "menu_description",
-                    "place_history",
-                    "arbitrary_description",
-                ]:
-                    clauses.append(
-                        {
-                            "match": {
-                                field: {
-                                    "query": token,
-                                    "fuzziness": "AUTO",
-                                }
-                            }
-                        }
-                    )
-                    wildcard_token = f"*{token}*"
-                    clauses.append(
-                        {
-                            "wildcard": {
-                                field: {
-                                    "value": wildcard_token
-                                }
-                            }
-                        }
-                    )
-
-            payload = {
-                "bool": {
-                    "should": clauses,
-                    "minimum_should_match": 1,
-                }
-            }
-            es_response = await es.search(
-                index="cafes",
-                query=payload,
-                size=limit,
-            )
-
-            hits = es_response["hits"]["hits"]
-            cafe_ids = [
-                hit["_source"]["id"]
-                for hit in hits
-            ]
-
-            if not cafe_ids:
-                if not await redis.get(
-                    "freshness"
-                ):
-                    await refresh_elasticsearch_cafes()
-                    await redis.set(
-                        "freshness", "true", 180
-                    )
-                return (
-                    main_service_pb2.SearchCafesByQueryPerCityResponse()
-                )
-
-            closest_cafes = (
-                await fetch_multiple_cafes(
-                    cafe_ids,
-                    sessionmanager.session,
-                    redis,
-                )
+            packed_views = await redis.get_or_set(
+                search_cache_key(
+                    generation,
+                    text,
+                    city,
+                    limit,
+                    cell,
+                    request.radius,
+                ),
+                lambda: self._search_cafes(
+                    text,
+                    city,
+                    limit,
+                    cell,
+                    request.radius,
+                ),
+                query_cache,
+                control,
             )
-            logging.debug(
-                f"Queried Cafes: {closest_cafes}"
+        except Exception as e:
+            logging.error(
+                f"An error occurred in SearchCafesByQueryPerCity: {e}"
             )
+            raise
 
-            response = (
-                main_service_pb2.SearchCafesByQueryPerCityResponse()
+        response = (
+            main_service_pb2.SearchCafesByQueryPerCityResponse()
+        )
+        if packed_views is None:
+            return response
+        cafes = [
+            CafeView.from_bytes(view)
+            for view in msgpack.unpackb(
+                packed_views
             )
-            for cafe in closest_cafes:
-                cafe_obj = await serialize_cafe(
-                    cafe,
+        ]
+        # Distances are the caller's own, whoever filled the cache.
+        located = filter_by_distance(
+            cafes,
+            request.latitude,
+            request.longitude,
+            request.radius if cell else 0,
+        )
+        if (
+            cell
+            and request.radius > 0
+            and len(located) < limit
+            and len(cafes)
+            >= limit
+            * settings.SEARCH_CELL_OVERFETCH
+        ):
+            # The shared entry ran out inside this caller's radius while
+            # more may match, so ask for exactly theirs, uncached.
+            located = filter_by_distance(
+                await self._search_views(
+                    text,
+                    city,
+                    limit,
                     request.latitude,
                     request.longitude,
+                    request.radius,
+                ),
+                request.latitude,
+                request.longitude,
+                request.radius,
+            )
+        for cafe, distance in located[:limit]:
+            cafe_obj = serialize_cafe(
+                cafe,
+                float(distance),
+            )
+            response.cafes.append(
+                main_service_pb2.Cafe(**cafe_obj)
+            )
+
+        if settings.DEBUG:
+            print(response.cafes)
+
+        return response
+
+    async def _search_cafes(
+        self,
+        text,
+        city,
+        limit,
+        cell,
+        radius,
+    ):
+        """Packed views of the best matches for everyone in the geohash cell.
+
+        Ranked from the centre of the cell, with the radius widened to
+        cover it from any point inside. SEARCH_CELL_OVERFETCH times `limit`
+        are kept, so that `limit` usually remain once a request drops
+        those beyond its exact radius.
+        """
+        latitude = longitude = 0
+        if cell:
+            (
+                min_lat,
+                min_lon,
+                max_lat,
+                max_lon,
+            ) = geohash.bounds(cell)
+            latitude = (min_lat + max_lat) / 2
+            longitude = (min_lon + max_lon) / 2
+            if radius > 0:
+                radius += float(
+                    CoordinatesProcessor.distances_from(
+                        latitude,
+                        longitude,
+                        [max_lat],
+                        [max_lon],
+                    )[
+                        0
+                    ]
                 )
-                response.cafes.append(
-                    main_service_pb2.Cafe(
-                        **cafe_obj
-                    )
+        return msgpack.packb(
+            [
+                cafe.to_bytes()
+                for cafe in await self._search_views(
+                    text,
+                    city,
+                    limit
+                    * settings.SEARCH_CELL_OVERFETCH,
+                    latitude,
+                    longitude,
+                    radius,
                 )
+            ]
+        )
 
-            await redis.set(
-                global_cache_key,
-                pickle.dumps(response),
-                180,
-            )
-            if settings.DEBUG:
-                print(response.cafes)
-
-            return response
+    async def _search_views(
+        self,
+        text,
+        city,
+        size,
+        latitude,
+        longitude,
+        radius,
+    ) -> List[CafeView]:
+        hits = await search_cafe_documents(
+            text,
+            size,
+            city,
+            latitude,
+            longitude,
+            radius,
+        )
+        # The change feed keeps the index complete, nothing found means
+        # nothing matches and is cached as such. Only cafes with
+        # coordinates have a city, and so display fields, to match on.
+        cafes = [
+            CafeView(**display)
+            for _, display in hits
+            if display
+        ]
+        logging.debug(f"Queried Cafes: {cafes}")
+        return cafes
 
-        except Exception as e:
-            logging.error(
-                f"An error occurred in SearchCafesByQueryPerCity: {e}"
+    async def SuggestCafes(
+        self, request, context
+    ):
+        city = request.city or "Moscow"
+        limit = request.len or 10
+        response = (
+            main_service_pb2.SuggestCafesResponse()
+        )
+        # Answered from memory on every keystroke, nothing to cache.
+        for (
+            suggestion,
+            cafe_id,
+            distance,
+        ) in suggestion_index.suggest(
+            clean_string(
+                request.prefix, partial=True
+            ),
+            city,
+            limit,
+            request.latitude,
+            request.longitude,
+        ):
+            response.suggestions.append(
+                main_service_pb2.Suggestion(
+                    text=suggestion.text,
+                    cafe_id=cafe_id,
+                    cafes_count=len(
+                        suggestion.cafes
+                    ),
+                    distance=distance,
+                )
             )
-            raise
+        return response
 
 
 class ArbitraryJSONServiceServicer(
@@ -643,7 +1027,31 @@ class ArbitraryJSONServiceServicer(
 
 
 async def serve():
-    await refresh_elasticsearch_cafes()
+    # Taken before the full syncs, so changes made meanwhile are replayed.
+    async with sessionmanager.session() as session:
+        changes_watermark = (
+            await models.CafeChange.get_watermark(
+                session
+            )
+        )
+    await load_local_indices(
+        sessionmanager.session
+    )
+    if settings.SEARCH_ENGINE != "local":
+        await refresh_elasticsearch_once()
+    await refresh_spatial_index()
+    spatial_index_task = asyncio.create_task(
+        maintain_spatial_index()
+    )
+    invalidations_task = asyncio.create_task(
+        redis.listen_invalidations()
+    )
+    cache_stats_task = asyncio.create_task(
+        report_cache_stats()
+    )
+    changes_task = asyncio.create_task(
+        follow_cafe_changes(changes_watermark)
+    )
 
     server = grpc_aio.server()
     main_service_pb2_grpc.add_CityCafeServiceServicer_to_server(
@@ -668,6 +1076,10 @@ async def serve():
     try:
         await server.wait_for_termination()
     finally:
+        spatial_index_task.cancel()
+        invalidations_task.cancel()
+        cache_stats_task.cancel()
+        changes_task.cancel()
         await server.stop(0)
 
 
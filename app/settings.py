@@ -8,6 +8,38 @@ class Settings(BaseSettings):
     POSTGRES_URL: str
     DEBUG: bool = True
     REDIS_URL: str
+    SPATIAL_INDEX_REFRESH_INTERVAL: int = 3600
+    GEOHASH_PRECISION: int = 6
+    LOCAL_CACHE_MAX_ITEMS: int = 4096
+    LOCAL_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    CACHE_LOCK_TIMEOUT: float = 5
+    CACHE_STATS_INTERVAL: int = 300
+    CACHE_TTL_JITTER: float = 0.1
+    CACHE_GENERAL_TTL: int = 3600
+    CACHE_GENERAL_STALE_TTL: int = 3600
+    CACHE_QUERY_TTL: int = 1800
+    CACHE_QUERY_STALE_TTL: int = 1800
+    CACHE_CAFE_TTL: int = 6 * 3600
+    CACHE_CAFE_STALE_TTL: int = 6 * 3600
+    CAFE_CHANGES_POLL_INTERVAL: float = 5
+    CAFE_CHANGES_RETENTION: int = 7 * 24 * 3600
+    # Outlives a few polls, so the leader keeps it between them.
+    CAFE_CHANGES_LEASE_TTL: int = 30
+    ES_BULK_CHUNK_SIZE: int = 500
+    ES_BULK_CONCURRENCY: int = 4
+    # Renewed while the refresh runs, so it only bounds how long a
+    # crashed replica keeps the others waiting.
+    ES_REFRESH_LOCK_TIMEOUT: int = 60
+    ES_REFRESH_LOCK_WAIT: int = 3600
+    SEARCH_DISTANCE_SCALE: float = 2
+    # Results cached per geohash cell, as a multiple of the requested count.
+    SEARCH_CELL_OVERFETCH: int = 2
+    # "elasticsearch" or "local", the in-process index.
+    SEARCH_ENGINE: str = "elasticsearch"
+    # Seconds Elasticsearch gets before the local index answers instead,
+    # 0 disables the fallback.
+    SEARCH_FALLBACK_TIMEOUT: float = 0.5
+    SUGGEST_CANDIDATES: int = 64
 
     class Config:
         env_file = ".env.app"
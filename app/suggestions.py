@@ -0,0 +1,261 @@
+from dataclasses import dataclass, field
+from typing import (
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+)
+
+import numpy as np
+
+from app import settings
+from geoutils import CoordinatesProcessor
+from textutils import RadixTrie
+
+SUGGEST_FIELDS = ("name", "name_ru", "address")
+
+
+@dataclass(slots=True)
+class Suggestion:
+    text: str
+    # cafe_id -> (latitude, longitude), None for cafes without coordinates.
+    cafes: dict = field(default_factory=dict)
+    _located: Optional[tuple] = None
+
+    def located(self) -> tuple:
+        """(cafe_ids, lats, lons) arrays of the cafes with coordinates."""
+        if self._located is None:
+            points = [
+                (cafe_id, *point)
+                for cafe_id, point in self.cafes.items()
+                if point
+            ]
+            self._located = tuple(
+                np.asarray(column)
+                for column in (
+                    zip(*points)
+                    if points
+                    else ([], [], [])
+                )
+            )
+        return self._located
+
+    def changed(self):
+        self._located = None
+
+
+class SuggestionIndex:
+    """Prefix completions of cafe names and addresses, per city.
+
+    Each distinct text is one suggestion, weighted by how many cafes bear
+    it, and is found from the start of any of its words.
+    """
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.trie = RadixTrie(
+            cache_size=settings.SUGGEST_CANDIDATES
+        )
+        # (city, normalized text) -> Suggestion
+        self._suggestions = {}
+        self._keys = {}
+        # cafe_id -> (city, normalized text) pairs it contributes to
+        self._cafes = {}
+
+    def __len__(self):
+        return len(self._suggestions)
+
+    @staticmethod
+    def _trie_keys(city: str, normalized: str):
+        words = normalized.split()
+        return [
+            f"{city}\0{' '.join(words[i:])}\0{normalized}"
+            for i in range(len(words))
+        ]
+
+    def _place(self, entry):
+        for key in self._keys.pop(entry, ()):
+            self.trie.remove(key)
+        suggestion = self._suggestions[entry]
+        if not suggestion.cafes:
+            del self._suggestions[entry]
+            return
+        keys = self._trie_keys(*entry)
+        for key in keys:
+            self.trie.insert(
+                key,
+                suggestion,
+                len(suggestion.cafes),
+            )
+        self._keys[entry] = keys
+
+    def _attach(
+        self,
+        cafe_id: str,
+        texts: Dict[str, Tuple[str, str]],
+        cities: List[str],
+        location: Optional[dict],
+    ) -> list:
+        point = (
+            (location["lat"], location["lon"])
+            if location
+            else None
+        )
+        by_text = {
+            " ".join(normalized.split()): text
+            for text, normalized in texts.values()
+            if normalized and normalized.strip()
+        }
+        entries = []
+        for city in {
+            city.lower() for city in cities
+        }:
+            for (
+                normalized,
+                text,
+            ) in by_text.items():
+                entry = (city, normalized)
+                suggestion = (
+                    self._suggestions.setdefault(
+                        entry, Suggestion(text)
+                    )
+                )
+                suggestion.cafes[cafe_id] = point
+                suggestion.changed()
+                entries.append(entry)
+        self._cafes[cafe_id] = entries
+        return entries
+
+    def build(self, cafes: Iterable[tuple]):
+        self.clear()
+        for cafe in cafes:
+            self._attach(*cafe)
+        # Placed once each, with their final weights.
+        for entry in list(self._suggestions):
+            self._place(entry)
+
+    def upsert(
+        self,
+        cafe_id: str,
+        texts: Dict[str, Tuple[str, str]],
+        cities: List[str],
+        location: Optional[dict],
+    ):
+        """`texts` maps SUGGEST_FIELDS to (display text, normalized text)."""
+        self.remove(cafe_id)
+        for entry in self._attach(
+            cafe_id, texts, cities, location
+        ):
+            self._place(entry)
+
+    def remove(self, cafe_id: str):
+        for entry in self._cafes.pop(cafe_id, ()):
+            suggestion = self._suggestions[entry]
+            del suggestion.cafes[cafe_id]
+            suggestion.changed()
+            self._place(entry)
+
+    def suggest(
+        self,
+        prefix: str,
+        city: str,
+        limit: int,
+        latitude: float = 0,
+        longitude: float = 0,
+    ) -> List[Tuple[Suggestion, str, float]]:
+        """(suggestion, closest cafe_id, its distance) for a normalized prefix.
+
+        The SUGGEST_CANDIDATES most common completions are ranked by their
+        cafe count, decayed by the distance to their closest cafe the way
+        search results are.
+        """
+        prefix = " ".join(prefix.split())
+        if not prefix or limit <= 0:
+            return []
+        candidates = {}
+        for _, _, suggestion in self.trie.top(
+            f"{city.lower()}\0{prefix}",
+            max(
+                settings.SUGGEST_CANDIDATES, limit
+            ),
+        ):
+            candidates.setdefault(
+                id(suggestion), suggestion
+            )
+        suggestions = list(candidates.values())
+        scores = np.array(
+            [len(s.cafes) for s in suggestions],
+            dtype=np.float64,
+        )
+        closest = [
+            min(s.cafes) for s in suggestions
+        ]
+        distances = np.zeros(len(suggestions))
+
+        located = (
+            [s.located() for s in suggestions]
+            if latitude and longitude
+            else []
+        )
+        owners = np.repeat(
+            np.arange(len(located)),
+            [len(ids) for ids, _, _ in located],
+        )
+        if len(owners):
+            cafe_ids, lats, lons = (
+                np.concatenate(column)
+                for column in zip(*located)
+            )
+            # Every located cafe of every candidate in one batch, the
+            # first of each owner in this order is its closest.
+            cafe_distances = np.round(
+                CoordinatesProcessor.distances_from(
+                    latitude,
+                    longitude,
+                    lats,
+                    lons,
+                ),
+                6,
+            )
+            order = np.lexsort(
+                (cafe_ids, cafe_distances, owners)
+            )
+            firsts = order[
+                np.flatnonzero(
+                    np.diff(
+                        owners[order], prepend=-1
+                    )
+                )
+            ]
+            for i in firsts:
+                closest[owners[i]] = str(
+                    cafe_ids[i]
+                )
+                distances[owners[i]] = (
+                    cafe_distances[i]
+                )
+            scores *= CoordinatesProcessor.gaussian_decay(
+                distances,
+                settings.SEARCH_DISTANCE_SCALE,
+            )
+        ranked = sorted(
+            range(len(suggestions)),
+            key=lambda i: (
+                -scores[i],
+                suggestions[i].text,
+            ),
+        )
+        return [
+            (
+                suggestions[i],
+                closest[i],
+                float(distances[i]),
+            )
+            for i in ranked[:limit]
+        ]
+
+
+suggestion_index = SuggestionIndex()
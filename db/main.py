@@ -55,6 +55,30 @@ class DatabaseSessionManager:
                 await connection.rollback()
                 raise
 
+    @contextlib.asynccontextmanager
+    async def listen(
+        self, channel: str, callback
+    ) -> AsyncIterator[None]:
+        """Run `callback` for every NOTIFY on `channel` while the block is active."""
+        if self._engine is None:
+            raise DisconnectionError(
+                "DatabaseSessionManager is not initialized"
+            )
+
+        async with self._engine.connect() as connection:
+            raw = (
+                await connection.get_raw_connection()
+            ).driver_connection
+            await raw.add_listener(
+                channel, callback
+            )
+            try:
+                yield
+            finally:
+                await raw.remove_listener(
+                    channel, callback
+                )
+
     @contextlib.asynccontextmanager
     async def session(
         self,
@@ -3,6 +3,7 @@ from uuid import uuid4
 
 import sqlalchemy
 from sqlalchemy import (
+    BigInteger,
     Column,
     DateTime,
     Float,
@@ -11,6 +12,8 @@ from sqlalchemy import (
     Numeric,
     String,
     and_,
+    delete,
+    func,
     select,
 )
 from sqlalchemy.exc import (
@@ -176,6 +179,106 @@ class Cafe(BaseModel):
         result = await db.execute(stmt)
         return result.scalar()
 
+    @classmethod
+    async def get_full_many(
+        cls,
+        db: AsyncSession,
+        cafe_ids: list,
+    ):
+        stmt = (
+            select(cls)
+            .filter(cls.id.in_(cafe_ids))
+            .options(
+                selectinload(cls.company),
+                selectinload(
+                    cls.menu
+                ).selectinload(Menu.entries),
+                selectinload(cls.description),
+                selectinload(cls.geodata),
+                selectinload(cls.roaster),
+            )
+        )
+        result = await db.execute(stmt)
+        cafes = {
+            cafe.id: cafe
+            for cafe in result.scalars().all()
+        }
+        return [
+            cafes.get(cafe_id)
+            for cafe_id in cafe_ids
+        ]
+
+    @classmethod
+    def _documents_select(cls):
+        """The columns indexed for search and display, one row per cafe."""
+        return (
+            select(
+                cls.id,
+                Company.name,
+                Company.name_ru,
+                Company.website,
+                Roaster.name.label(
+                    "roaster_name"
+                ),
+                Roaster.website.label(
+                    "roaster_website"
+                ),
+                Geodata.address,
+                Geodata.latitude,
+                Geodata.longitude,
+                City.name.label("city"),
+                City.name_ru.label("city_ru"),
+                Description.id.label(
+                    "description_id"
+                ),
+                Description.location_description,
+                Description.interior_description,
+                Description.menu_description,
+                Description.place_history,
+                Description.arbitrary_description,
+                Description.image_uuid,
+            )
+            .join(cls.company)
+            .outerjoin(cls.roaster)
+            .outerjoin(cls.geodata)
+            .outerjoin(Geodata.city)
+            .outerjoin(cls.description)
+        )
+
+    @classmethod
+    async def get_documents(
+        cls,
+        db: AsyncSession,
+        cafe_ids: list,
+    ):
+        stmt = cls._documents_select().filter(
+            cls.id.in_(cafe_ids)
+        )
+        result = await db.execute(stmt)
+        return result.all()
+
+    @classmethod
+    async def stream_documents(
+        cls,
+        db: AsyncSession,
+        chunk_size: int = 500,
+    ):
+        """Every cafe's document row through a server-side cursor.
+
+        Ordered by id bytewise, the same order Elasticsearch sorts
+        keywords in.
+        """
+        stmt = (
+            cls._documents_select()
+            .order_by(cls.id.collate("C"))
+            .execution_options(
+                yield_per=chunk_size
+            )
+        )
+        result = await db.stream(stmt)
+        async for row in result:
+            yield row
+
     def __repr__(self):
         try:
             return (
@@ -286,6 +389,29 @@ class Geodata(BaseModel):
         result = await db.execute(stmt)
         return result.scalars().all()
 
+    @classmethod
+    async def get_coordinates(
+        cls,
+        db: AsyncSession,
+        cafe_ids: list = None,
+    ):
+        stmt = (
+            select(
+                cls.latitude,
+                cls.longitude,
+                cls.cafe_id,
+            )
+            .join(cls.country)
+            .filter(cls.cafe_id.isnot(None))
+        )
+        if cafe_ids is not None:
+            stmt = stmt.filter(
+                cls.cafe_id.in_(cafe_ids)
+            )
+
+        result = await db.execute(stmt)
+        return result.all()
+
     def __repr__(self):
         try:
             return f"{self.country.name_ru}, {self.city.name_ru}, {self.address}"
@@ -570,3 +696,72 @@ class City(Base):
         return (
             f"Город {self.name_ru} ({self.code})"
         )
+
+
+class CafeChange(Base):
+    """Outbox row written by triggers whenever data shown for a cafe changes."""
+
+    __tablename__ = "cafe_changes"
+
+    id = Column(BigInteger, primary_key=True)
+    txid = Column(
+        BigInteger,
+        nullable=False,
+        index=True,
+        server_default=func.txid_current(),
+    )
+    cafe_id = Column(String, nullable=False)
+    source = Column(String, nullable=False)
+    operation = Column(String, nullable=False)
+    created_at = Column(
+        DateTime,
+        nullable=False,
+        index=True,
+        server_default=func.now(),
+    )
+
+    @classmethod
+    async def get_watermark(
+        cls, db: AsyncSession
+    ) -> int:
+        """Transaction id below which every transaction has finished."""
+        result = await db.execute(
+            select(
+                func.txid_snapshot_xmin(
+                    func.txid_current_snapshot()
+                )
+            )
+        )
+        return result.scalar()
+
+    @classmethod
+    async def get_between(
+        cls,
+        db: AsyncSession,
+        low: int,
+        high: int,
+    ):
+        stmt = (
+            select(cls)
+            .filter(
+                cls.txid >= low,
+                cls.txid < high,
+            )
+            .order_by(cls.id)
+        )
+        result = await db.execute(stmt)
+        return result.scalars().all()
+
+    @classmethod
+    async def prune(
+        cls, db: AsyncSession, before: datetime
+    ):
+        await db.execute(
+            delete(cls).filter(
+                cls.created_at < before
+            )
+        )
+        await db.commit()
+
+    def __repr__(self):
+        return f"{self.operation} {self.source}: {self.cafe_id}"
@@ -0,0 +1,162 @@
+from dataclasses import dataclass, field
+from typing import Optional
+
+import msgpack
+
+# Bump whenever the packed layout changes; it is part of the cache key,
+# so entries written by older replicas are simply never read.
+CAFE_VIEW_VERSION = 1
+
+ROASTER_FIELDS = ("name", "website")
+DESCRIPTION_FIELDS = (
+    "location_description",
+    "interior_description",
+    "menu_description",
+    "place_history",
+    "arbitrary_description",
+    "image_uuid",
+)
+
+
+@dataclass(slots=True)
+class CafeView:
+    id: str
+    name: Optional[str]
+    address: str
+    latitude: float
+    longitude: float
+    website: Optional[str] = None
+    roaster: dict = field(default_factory=dict)
+    description: dict = field(
+        default_factory=dict
+    )
+
+    @classmethod
+    def from_model(cls, cafe):
+        return cls(
+            id=cafe.id,
+            name=cafe.company.name_ru,
+            address=cafe.geodata.address,
+            latitude=float(cafe.geodata.latitude),
+            longitude=float(
+                cafe.geodata.longitude
+            ),
+            website=cafe.company.website,
+            roaster=(
+                {
+                    name: getattr(
+                        cafe.roaster, name
+                    )
+                    for name in ROASTER_FIELDS
+                }
+                if cafe.roaster
+                else {}
+            ),
+            description=(
+                {
+                    name: getattr(
+                        cafe.description, name
+                    )
+                    for name in DESCRIPTION_FIELDS
+                }
+                if cafe.description
+                else {}
+            ),
+        )
+
+    @classmethod
+    def from_row(cls, row):
+        """From a row of Cafe.get_documents or Cafe.stream_documents."""
+        return cls(
+            id=row.id,
+            name=row.name_ru,
+            address=row.address,
+            latitude=float(row.latitude),
+            longitude=float(row.longitude),
+            website=row.website,
+            roaster=(
+                dict(
+                    zip(
+                        ROASTER_FIELDS,
+                        (
+                            row.roaster_name,
+                            row.roaster_website,
+                        ),
+                    )
+                )
+                if row.roaster_name
+                else {}
+            ),
+            description=(
+                {
+                    name: getattr(row, name)
+                    for name in DESCRIPTION_FIELDS
+                }
+                if row.description_id
+                else {}
+            ),
+        )
+
+    def to_bytes(self) -> bytes:
+        return msgpack.packb(
+            [
+                self.id,
+                self.name,
+                self.address,
+                self.latitude,
+                self.longitude,
+                self.website,
+                (
+                    [
+                        self.roaster.get(name)
+                        for name in ROASTER_FIELDS
+                    ]
+                    if self.roaster
+                    else None
+                ),
+                (
+                    [
+                        self.description.get(name)
+                        for name in DESCRIPTION_FIELDS
+                    ]
+                    if self.description
+                    else None
+                ),
+            ]
+        )
+
+    @classmethod
+    def from_bytes(cls, data: bytes):
+        (
+            cafe_id,
+            name,
+            address,
+            latitude,
+            longitude,
+            website,
+            roaster,
+            description,
+        ) = msgpack.unpackb(data)
+        return cls(
+            id=cafe_id,
+            name=name,
+            address=address,
+            latitude=latitude,
+            longitude=longitude,
+            website=website,
+            roaster=(
+                dict(zip(ROASTER_FIELDS, roaster))
+                if roaster
+                else {}
+            ),
+            description=(
+                dict(
+                    zip(
+                        DESCRIPTION_FIELDS,
+                        description,
+                    )
+                )
+                if description
+                else {}
+            ),
+        )
@@ -1,3 +1,7 @@
 from geoutils.coordinates_processor import (
     CoordinatesProcessor,
 )
+from geoutils.spatial_index import (
+    SpatialIndex,
+    rank_by_distance,
+)
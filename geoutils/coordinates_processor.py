@@ -1,6 +1,9 @@
 import math
 
 import httpx
+import numpy as np
+
+EARTH_RADIUS_KM = 6371
 
 
 class CoordinatesProcessor:
@@ -29,14 +32,100 @@ class CoordinatesProcessor:
             * math.sin(dlon / 2) ** 2
         )
         c = 2 * math.asin(math.sqrt(a))
-        r = 6371  # Radius of earth in kilometers. Use 3956 for miles. Determines return value units.
+        r = EARTH_RADIUS_KM  # Radius of earth in kilometers. Use 3956 for miles. Determines return value units.
         return c * r
 
+    @staticmethod
+    def distances_from(
+        lat: float,
+        lon: float,
+        lats,
+        lons,
+    ) -> np.ndarray:
+        lat1, lon1 = np.radians(lat), np.radians(
+            lon
+        )
+        lat2 = np.radians(
+            np.asarray(lats, dtype=np.float64)
+        )
+        lon2 = np.radians(
+            np.asarray(lons, dtype=np.float64)
+        )
+
+        # haversine formula, for the whole batch at once
+        a = (
+            np.sin((lat2 - lat1) / 2) ** 2
+            + np.cos(lat1)
+            * np.cos(lat2)
+            * np.sin((lon2 - lon1) / 2) ** 2
+        )
+        return (
+            2
+            * EARTH_RADIUS_KM
+            * np.arcsin(
+                np.sqrt(np.clip(a, 0.0, 1.0))
+            )
+        )
+
+    @staticmethod
+    def gaussian_decay(distances, scale: float):
+        """Elasticsearch's gauss decay: 1 at the origin, a half at `scale` km."""
+        return np.exp(
+            np.log(0.5)
+            * (np.asarray(distances) / scale) ** 2
+        )
+
+    @staticmethod
+    def top_k(distances, k: int) -> np.ndarray:
+        """Positions of the k smallest distances, closest first."""
+        distances = np.asarray(distances)
+        k = min(k, len(distances))
+        if k <= 0:
+            return np.empty(0, dtype=np.intp)
+        if k < len(distances):
+            candidates = np.argpartition(
+                distances, k - 1
+            )[:k]
+        else:
+            candidates = np.arange(len(distances))
+        return candidates[
+            np.argsort(
+                distances[candidates],
+                kind="stable",
+            )
+        ]
+
     @classmethod
     async def coordinates_to_bbox(
-        cls, latitude: float, longitude: float
+        cls,
+        latitude: float,
+        longitude: float,
+        radius: float,
     ):
-        pass
+        """(min_lat, min_lon, max_lat, max_lon) enclosing a radius in km."""
+        dlat = math.degrees(
+            radius / EARTH_RADIUS_KM
+        )
+        min_lat = max(latitude - dlat, -90.0)
+        max_lat = min(latitude + dlat, 90.0)
+        if min_lat <= -90.0 or max_lat >= 90.0:
+            return min_lat, -180.0, max_lat, 180.0
+
+        dlon = math.degrees(
+            radius
+            / (
+                EARTH_RADIUS_KM
+                * math.cos(math.radians(latitude))
+            )
+        )
+        min_lon, max_lon = (
+            longitude - dlon,
+            longitude + dlon,
+        )
+        if min_lon < -180.0 or max_lon > 180.0:
+            # Crossing the antimeridian, fall back to the whole band.
+            return min_lat, -180.0, max_lat, 180.0
+        return min_lat, min_lon, max_lat, max_lon
 
     @classmethod
     async def coordinates_to_distance(
@@ -0,0 +1,62 @@
+from typing import Tuple
+
+BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+DECODE_MAP = {
+    char: i for i, char in enumerate(BASE32)
+}
+
+
+def encode(
+    lat: float, lon: float, precision: int = 6
+) -> str:
+    lat_range, lon_range = [-90.0, 90.0], [
+        -180.0,
+        180.0,
+    ]
+    chars, bits, bit_count, even = [], 0, 0, True
+    while len(chars) < precision:
+        rng, value = (
+            (lon_range, lon)
+            if even
+            else (lat_range, lat)
+        )
+        mid = (rng[0] + rng[1]) / 2
+        if value >= mid:
+            bits = (bits << 1) | 1
+            rng[0] = mid
+        else:
+            bits <<= 1
+            rng[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(BASE32[bits])
+            bits, bit_count = 0, 0
+    return "".join(chars)
+
+
+def bounds(
+    geohash: str,
+) -> Tuple[float, float, float, float]:
+    """(min_lat, min_lon, max_lat, max_lon) of a geohash cell."""
+    lat_range, lon_range = [-90.0, 90.0], [
+        -180.0,
+        180.0,
+    ]
+    even = True
+    for char in geohash:
+        value = DECODE_MAP[char]
+        for shift in range(4, -1, -1):
+            rng = lon_range if even else lat_range
+            mid = (rng[0] + rng[1]) / 2
+            if value >> shift & 1:
+                rng[0] = mid
+            else:
+                rng[1] = mid
+            even = not even
+    return (
+        lat_range[0],
+        lon_range[0],
+        lat_range[1],
+        lon_range[1],
+    )
@@ -0,0 +1,286 @@
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+from geoutils.coordinates_processor import (
+    EARTH_RADIUS_KM,
+    CoordinatesProcessor,
+)
+
+
+def to_unit_vectors(lats, lons):
+    lat = np.radians(
+        np.asarray(lats, dtype=np.float64)
+    )
+    lon = np.radians(
+        np.asarray(lons, dtype=np.float64)
+    )
+    cos_lat = np.cos(lat)
+    return np.column_stack(
+        (
+            cos_lat * np.cos(lon),
+            cos_lat * np.sin(lon),
+            np.sin(lat),
+        )
+    )
+
+
+def km_to_chord(km):
+    return 2 * np.sin(
+        np.minimum(km / EARTH_RADIUS_KM, np.pi)
+        / 2
+    )
+
+
+def rank_by_distance(
+    distances: np.ndarray,
+    ids: np.ndarray,
+    k: int,
+    after: Optional[Tuple[float, str]] = None,
+    radius: Optional[float] = None,
+) -> List[Tuple[float, str]]:
+    """The k closest (distance, cafe_id) pairs, ordered by distance then id.
+
+    `after` is a keyset cursor: only pairs strictly greater than it are
+    returned, so consecutive pages never overlap or skip ties.
+    """
+    # Vectorized trig is not bit-for-bit reproducible across batches of
+    # different sizes, so compare distances at millimetre precision.
+    distances = np.round(distances, 6)
+    mask = np.ones(len(distances), dtype=bool)
+    if radius is not None:
+        mask &= distances <= radius
+    if after is not None:
+        last_distance, last_id = after
+        mask &= (distances > last_distance) | (
+            (distances == last_distance)
+            & (ids > last_id)
+        )
+    positions = np.flatnonzero(mask)
+    if k <= 0 or not len(positions):
+        return []
+
+    closest = positions[
+        CoordinatesProcessor.top_k(
+            distances[positions], k
+        )
+    ]
+    # Pull in everything tied with the k-th distance so the id
+    # tie-break is applied over the full tie group.
+    positions = positions[
+        distances[positions]
+        <= distances[closest[-1]]
+    ]
+    order = np.lexsort(
+        (ids[positions], distances[positions])
+    )
+    return [
+        (float(distances[i]), str(ids[i]))
+        for i in positions[order][:k]
+    ]
+
+
+class SpatialIndex:
+    """KD-tree over cafe coordinates projected onto the unit sphere.
+
+    Chord length between two unit vectors grows monotonically with the
+    great-circle distance, so euclidean nearest-neighbour queries on the
+    tree return cafes in the same order as a haversine sort would.
+    """
+
+    def __init__(self):
+        self._state = (
+            None,
+            np.empty(0, dtype=str),
+            np.empty(0),
+            np.empty(0),
+        )
+
+    def __len__(self):
+        return len(self._state[1])
+
+    def build(
+        self,
+        rows: Iterable[Tuple[float, float, str]],
+    ):
+        rows = list(rows)
+        ids = np.array(
+            [cafe_id for _, _, cafe_id in rows],
+            dtype=str,
+        )
+        lats = np.array(
+            [lat for lat, _, _ in rows],
+            dtype=np.float64,
+        )
+        lons = np.array(
+            [lon for _, lon, _ in rows],
+            dtype=np.float64,
+        )
+        tree = (
+            cKDTree(to_unit_vectors(lats, lons))
+            if rows
+            else None
+        )
+        # Swap everything at once so readers never mix a tree with
+        # coordinates from a different build.
+        self._state = (tree, ids, lats, lons)
+
+    def update(
+        self,
+        rows: Iterable[Tuple[float, float, str]],
+        removed: Iterable[str] = (),
+    ):
+        """Rebuild from the current points with `rows` upserted and `removed` dropped."""
+        _, ids, lats, lons = self._state
+        rows = list(rows)
+        keep = ~np.isin(
+            ids,
+            [cafe_id for _, _, cafe_id in rows]
+            + list(removed),
+        )
+        self.build(
+            list(
+                zip(
+                    lats[keep].tolist(),
+                    lons[keep].tolist(),
+                    ids[keep].tolist(),
+                )
+            )
+            + rows
+        )
+
+    def nearest(
+        self,
+        lat: float,
+        lon: float,
+        k: int,
+        after: Optional[Tuple[float, str]] = None,
+    ) -> List[Tuple[float, str]]:
+        tree, ids, lats, lons = self._state
+        if tree is None or k <= 0:
+            return []
+        point = to_unit_vectors([lat], [lon])[0]
+        skipped = (
+            tree.query_ball_point(
+                point,
+                r=km_to_chord(after[0]),
+                return_length=True,
+            )
+            if after is not None
+            else 0
+        )
+        m = min(skipped + k, len(ids))
+        while True:
+            _, positions = tree.query(point, k=m)
+            positions = np.atleast_1d(positions)
+            distances = CoordinatesProcessor.distances_from(
+                lat,
+                lon,
+                lats[positions],
+                lons[positions],
+            )
+            hits = rank_by_distance(
+                distances,
+                ids[positions],
+                k,
+                after=after,
+            )
+            # A hit on the edge of the fetched ball may be tied with
+            # cafes just outside it, so widen the query until it is not.
+            if m == len(ids) or (
+                len(hits) == k
+                and hits[-1][0]
+                < np.round(distances.max(), 6)
+            ):
+                return hits
+            m = min(m * 2, len(ids))
+
+    def cover(
+        self,
+        bounds: Tuple[float, float, float, float],
+        k: int,
+    ) -> Tuple[
+        np.ndarray, np.ndarray, np.ndarray
+    ]:
+        """Cafes that can be among the k nearest to any point of `bounds`.
+
+        For a user at most `h` km from the box centre, the k-th nearest cafe
+        is at most `d_k + h` away from them, so no cafe further than
+        `d_k + 2h` from the centre can make their top k.
+        """
+        tree, ids, lats, lons = self._state
+        if tree is None or k <= 0:
+            return ids[:0], lats[:0], lons[:0]
+        min_lat, min_lon, max_lat, max_lon = (
+            bounds
+        )
+        lat = (min_lat + max_lat) / 2
+        lon = (min_lon + max_lon) / 2
+        half_diagonal = (
+            CoordinatesProcessor.distances_from(
+                lat,
+                lon,
+                [
+                    min_lat,
+                    min_lat,
+                    max_lat,
+                    max_lat,
+                ],
+                [
+                    min_lon,
+                    max_lon,
+                    min_lon,
+                    max_lon,
+                ],
+            ).max()
+        )
+        kth = self.nearest(lat, lon, k)[-1][0]
+        # A metre of slack for the rounding done by rank_by_distance.
+        reach = kth + 2 * half_diagonal + 1e-3
+        positions = np.asarray(
+            tree.query_ball_point(
+                to_unit_vectors([lat], [lon])[0],
+                r=km_to_chord(reach),
+            ),
+            dtype=np.intp,
+        )
+        return (
+            ids[positions],
+            lats[positions],
+            lons[positions],
+        )
+
+    def within(
+        self,
+        lat: float,
+        lon: float,
+        radius: float,
+        k: int,
+        after: Optional[Tuple[float, str]] = None,
+    ) -> List[Tuple[float, str]]:
+        tree, ids, lats, lons = self._state
+        if tree is None or k <= 0 or radius <= 0:
+            return []
+        positions = np.asarray(
+            tree.query_ball_point(
+                to_unit_vectors([lat], [lon])[0],
+                r=km_to_chord(radius),
+            ),
+            dtype=np.intp,
+        )
+        distances = (
+            CoordinatesProcessor.distances_from(
+                lat,
+                lon,
+                lats[positions],
+                lons[positions],
+            )
+        )
+        return rank_by_distance(
+            distances,
+            ids[positions],
+            k,
+            after=after,
+            radius=radius,
+        )
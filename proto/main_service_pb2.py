@@ -27,7 +27,7 @@ from google.protobuf import (
 
 
 DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(
-    b'\n\x18proto/main_service.proto\x12\x04main\x1a\x1cgoogle/protobuf/struct.proto"\xa1\x01\n\x17ListCafesPerCityRequest\x12\x10\n\x08latitude\x18\x01 \x01(\x01\x12\x11\n\tlongitude\x18\x02 \x01(\x01\x12\x0e\n\x06radius\x18\x03 \x01(\x01\x12\x0b\n\x03len\x18\x04 \x01(\x05\x12\x0c\n\x04page\x18\x05 \x01(\x05\x12\x0c\n\x04\x63ity\x18\x06 \x01(\t\x12\x14\n\x0c\x62ypass_cache\x18\x07 \x01(\x08\x12\x12\n\ndrop_cache\x18\x08 \x01(\x08"5\n\x18ListCafesPerCityResponse\x12\x19\n\x05\x63\x61\x66\x65s\x18\x01 \x03(\x0b\x32\n.main.Cafe"\xc4\x01\n\x04\x43\x61\x66\x65\x12\x0c\n\x04name\x18\x01 \x01(\t\x12\x10\n\x08\x64istance\x18\x02 \x01(\x01\x12\x0f\n\x07\x61\x64\x64ress\x18\x03 \x01(\t\x12\r\n\x05photo\x18\x04 \x01(\t\x12&\n\x0b\x64\x65scription\x18\x05 \x01(\x0b\x32\x11.main.Description\x12\x10\n\x08latitude\x18\x06 \x01(\x01\x12\x11\n\tlongitude\x18\x07 \x01(\x01\x12\x1e\n\x07roaster\x18\x08 \x01(\x0b\x32\r.main.Roaster\x12\x0f\n\x07website\x18\t \x01(\t"\xad\x01\n\x0b\x44\x65scription\x12\x1c\n\x14location_description\x18\x01 \x01(\t\x12\x1c\n\x14interior_description\x18\x02 \x01(\t\x12\x18\n\x10menu_description\x18\x03 \x01(\t\x12\x15\n\rplace_history\x18\x04 \x01(\t\x12\x1d\n\x15\x61rbitrary_description\x18\x05 \x01(\t\x12\x12\n\nimage_uuid\x18\x06 \x01(\t"(\n\x07Roaster\x12\x0c\n\x04name\x18\x01 \x01(\t\x12\x0f\n\x07website\x18\x02 \x01(\t"\xb9\x01\n SearchCafesByQueryPerCityRequest\x12\r\n\x05query\x18\x01 \x01(\t\x12\x10\n\x08latitude\x18\x02 \x01(\x01\x12\x11\n\tlongitude\x18\x03 \x01(\x01\x12\x0e\n\x06radius\x18\x04 \x01(\x01\x12\x0b\n\x03len\x18\x05 \x01(\x05\x12\x0c\n\x04page\x18\x06 \x01(\x05\x12\x0c\n\x04\x63ity\x18\x07 \x01(\t\x12\x14\n\x0c\x62ypass_cache\x18\x08 \x01(\x08\x12\x12\n\ndrop_cache\x18\t \x01(\x08">\n!SearchCafesByQueryPerCityResponse\x12\x19\n\x05\x63\x61\x66\x65s\x18\x01 \x03(\x0b\x32\n.main.Cafe"\'\n\x15GetCafeDetailsRequest\x12\x0e\n\x06\x63\x61\x66\x65Id\x18\x01 \x01(\t"A\n\x13\x43\x61\x66\x65\x44\x65tailsResponse\x12\n\n\x02id\x18\x01 \x01(\t\x12\x0c\n\x04menu\x18\x02 \x01(\t\x12\x10\n\x08schedule\x18\x03 \x01(\t"E\n\x17GetArbitraryJSONRequest\x12*\n\tjson_data\x18\x01 \x01(\x0b\x32\x17.google.protobuf.Struct"F\n\x18GetArbitraryJSONResponse\x12*\n\tjson_data\x18\x01 \x01(\x0b\x32\x17.google.protobuf.Struct2\xd6\x01\n\x0f\x43ityCafeService\x12S\n\x10ListCafesPerCity\x12\x1d.main.ListCafesPerCityRequest\x1a\x1e.main.ListCafesPerCityResponse"\x00\x12n\n\x19SearchCafesByQueryPerCity\x12&.main.SearchCafesByQueryPerCityRequest\x1a\'.main.SearchCafesByQueryPerCityResponse"\x00\x32k\n\x14\x41rbitraryJSONService\x12S\n\x10GetArbitraryJSON\x12\x1d.main.GetArbitraryJSONRequest\x1a\x1e.main.GetArbitraryJSONResponse"\x00\x62\x06proto3'
+    b'\n\x18proto/main_service.proto\x12\x04main\x1a\x1cgoogle/protobuf/struct.proto"\xdf\x01\n\x17ListCafesPerCityRequest\x12\x10\n\x08latitude\x18\x01 \x01(\x01\x12\x11\n\tlongitude\x18\x02 \x01(\x01\x12\x0e\n\x06radius\x18\x03 \x01(\x01\x12\x0b\n\x03len\x18\x04 \x01(\x05\x12\x0c\n\x04page\x18\x05 \x01(\x05\x12\x0c\n\x04\x63ity\x18\x06 \x01(\t\x12\x14\n\x0c\x62ypass_cache\x18\x07 \x01(\x08\x12\x12\n\ndrop_cache\x18\x08 \x01(\x08\x12\x0e\n\x06\x63ursor\x18\t \x01(\t\x12\x1a\n\rmax_staleness\x18\n \x01(\x05H\x00\x88\x01\x01\x42\x10\n\x0e_max_staleness"J\n\x18ListCafesPerCityResponse\x12\x19\n\x05\x63\x61\x66\x65s\x18\x01 \x03(\x0b\x32\n.main.Cafe\x12\x13\n\x0bnext_cursor\x18\x02 \x01(\t"\xc4\x01\n\x04\x43\x61\x66\x65\x12\x0c\n\x04name\x18\x01 \x01(\t\x12\x10\n\x08\x64istance\x18\x02 \x01(\x01\x12\x0f\n\x07\x61\x64\x64ress\x18\x03 \x01(\t\x12\r\n\x05photo\x18\x04 \x01(\t\x12&\n\x0b\x64\x65scription\x18\x05 \x01(\x0b\x32\x11.main.Description\x12\x10\n\x08latitude\x18\x06 \x01(\x01\x12\x11\n\tlongitude\x18\x07 \x01(\x01\x12\x1e\n\x07roaster\x18\x08 \x01(\x0b\x32\r.main.Roaster\x12\x0f\n\x07website\x18\t \x01(\t"\xad\x01\n\x0b\x44\x65scription\x12\x1c\n\x14location_description\x18\x01 \x01(\t\x12\x1c\n\x14interior_description\x18\x02 \x01(\t\x12\x18\n\x10menu_description\x18\x03 \x01(\t\x12\x15\n\rplace_history\x18\x04 \x01(\t\x12\x1d\n\x15\x61rbitrary_description\x18\x05 \x01(\t\x12\x12\n\nimage_uuid\x18\x06 \x01(\t"(\n\x07Roaster\x12\x0c\n\x04name\x18\x01 \x01(\t\x12\x0f\n\x07website\x18\x02 \x01(\t"\xe7\x01\n SearchCafesByQueryPerCityRequest\x12\r\n\x05query\x18\x01 \x01(\t\x12\x10\n\x08latitude\x18\x02 \x01(\x01\x12\x11\n\tlongitude\x18\x03 \x01(\x01\x12\x0e\n\x06radius\x18\x04 \x01(\x01\x12\x0b\n\x03len\x18\x05 \x01(\x05\x12\x0c\n\x04page\x18\x06 \x01(\x05\x12\x0c\n\x04\x63ity\x18\x07 \x01(\t\x12\x14\n\x0c\x62ypass_cache\x18\x08 \x01(\x08\x12\x12\n\ndrop_cache\x18\t \x01(\x08\x12\x1a\n\rmax_staleness\x18\n \x01(\x05H\x00\x88\x01\x01\x42\x10\n\x0e_max_staleness">\n!SearchCafesByQueryPerCityResponse\x12\x19\n\x05\x63\x61\x66\x65s\x18\x01 \x03(\x0b\x32\n.main.Cafe"e\n\x13SuggestCafesRequest\x12\x0e\n\x06prefix\x18\x01 \x01(\t\x12\x10\n\x08latitude\x18\x02 \x01(\x01\x12\x11\n\tlongitude\x18\x03 \x01(\x01\x12\x0b\n\x03len\x18\x04 \x01(\x05\x12\x0c\n\x04\x63ity\x18\x05 \x01(\t"R\n\nSuggestion\x12\x0c\n\x04text\x18\x01 \x01(\t\x12\x0f\n\x07\x63\x61\x66\x65_id\x18\x02 \x01(\t\x12\x13\n\x0b\x63\x61\x66\x65s_count\x18\x03 \x01(\x05\x12\x10\n\x08\x64istance\x18\x04 \x01(\x01"=\n\x14SuggestCafesResponse\x12%\n\x0bsuggestions\x18\x01 \x03(\x0b\x32\x10.main.Suggestion"\'\n\x15GetCafeDetailsRequest\x12\x0e\n\x06\x63\x61\x66\x65Id\x18\x01 \x01(\t"A\n\x13\x43\x61\x66\x65\x44\x65tailsResponse\x12\n\n\x02id\x18\x01 \x01(\t\x12\x0c\n\x04menu\x18\x02 \x01(\t\x12\x10\n\x08schedule\x18\x03 \x01(\t"E\n\x17GetArbitraryJSONRequest\x12*\n\tjson_data\x18\x01 \x01(\x0b\x32\x17.google.protobuf.Struct"F\n\x18GetArbitraryJSONResponse\x12*\n\tjson_data\x18\x01 \x01(\x0b\x32\x17.google.protobuf.Struct2\x9f\x02\n\x0f\x43ityCafeService\x12S\n\x10ListCafesPerCity\x12\x1d.main.ListCafesPerCityRequest\x1a\x1e.main.ListCafesPerCityResponse"\x00\x12n\n\x19SearchCafesByQueryPerCity\x12&.main.SearchCafesByQueryPerCityRequest\x1a\'.main.SearchCafesByQueryPerCityResponse"\x00\x12G\n\x0cSuggestCafes\x12\x19.main.SuggestCafesRequest\x1a\x1a.main.SuggestCafesResponse"\x00\x32k\n\x14\x41rbitraryJSONService\x12S\n\x10GetArbitraryJSON\x12\x1d.main.GetArbitraryJSONRequest\x1a\x1e.main.GetArbitraryJSONResponse"\x00\x62\x06proto3'
 )
 
 _globals = globals()
@@ -44,67 +44,83 @@ if _descriptor._USE_C_DESCRIPTORS == False:
     ]._serialized_start = 65
     _globals[
         "_LISTCAFESPERCITYREQUEST"
-    ]._serialized_end = 226
+    ]._serialized_end = 288
     _globals[
         "_LISTCAFESPERCITYRESPONSE"
-    ]._serialized_start = 228
+    ]._serialized_start = 290
     _globals[
         "_LISTCAFESPERCITYRESPONSE"
-    ]._serialized_end = 281
-    _globals["_CAFE"]._serialized_start = 284
-    _globals["_CAFE"]._serialized_end = 480
+    ]._serialized_end = 364
+    _globals["_CAFE"]._serialized_start = 367
+    _globals["_CAFE"]._serialized_end = 563
     _globals["_DESCRIPTION"]._serialized_start = (
-        483
+        566
     )
-    _globals["_DESCRIPTION"]._serialized_end = 656
-    _globals["_ROASTER"]._serialized_start = 658
-    _globals["_ROASTER"]._serialized_end = 698
+    _globals["_DESCRIPTION"]._serialized_end = 739
+    _globals["_ROASTER"]._serialized_start = 741
+    _globals["_ROASTER"]._serialized_end = 781
     _globals[
         "_SEARCHCAFESBYQUERYPERCITYREQUEST"
-    ]._serialized_start = 701
+    ]._serialized_start = 784
     _globals[
         "_SEARCHCAFESBYQUERYPERCITYREQUEST"
-    ]._serialized_end = 886
+    ]._serialized_end = 1015
     _globals[
         "_SEARCHCAFESBYQUERYPERCITYRESPONSE"
-    ]._serialized_start = 888
+    ]._serialized_start = 1017
     _globals[
         "_SEARCHCAFESBYQUERYPERCITYRESPONSE"
-    ]._serialized_end = 950
+    ]._serialized_end = 1079
+    _globals[
+        "_SUGGESTCAFESREQUEST"
+    ]._serialized_start = 1081
+    _globals[
+        "_SUGGESTCAFESREQUEST"
+    ]._serialized_end = 1182
+    _globals["_SUGGESTION"]._serialized_start = (
+        1184
+    )
+    _globals["_SUGGESTION"]._serialized_end = 1266
+    _globals[
+        "_SUGGESTCAFESRESPONSE"
+    ]._serialized_start = 1268
+    _globals[
+        "_SUGGESTCAFESRESPONSE"
+    ]._serialized_end = 1329
     _globals[
         "_GETCAFEDETAILSREQUEST"
-    ]._serialized_start = 952
+    ]._serialized_start = 1331
     _globals[
         "_GETCAFEDETAILSREQUEST"
-    ]._serialized_end = 991
+    ]._serialized_end = 1370
     _globals[
         "_CAFEDETAILSRESPONSE"
-    ]._serialized_start = 993
+    ]._serialized_start = 1372
     _globals[
         "_CAFEDETAILSRESPONSE"
-    ]._serialized_end = 1058
+    ]._serialized_end = 1437
     _globals[
         "_GETARBITRARYJSONREQUEST"
-    ]._serialized_start = 1060
+    ]._serialized_start = 1439
     _globals[
         "_GETARBITRARYJSONREQUEST"
-    ]._serialized_end = 1129
+    ]._serialized_end = 1508
     _globals[
         "_GETARBITRARYJSONRESPONSE"
-    ]._serialized_start = 1131
+    ]._serialized_start = 1510
     _globals[
         "_GETARBITRARYJSONRESPONSE"
-    ]._serialized_end = 1201
+    ]._serialized_end = 1580
     _globals[
         "_CITYCAFESERVICE"
-    ]._serialized_start = 1204
+    ]._serialized_start = 1583
     _globals[
         "_CITYCAFESERVICE"
-    ]._serialized_end = 1418
+    ]._serialized_end = 1870
     _globals[
         "_ARBITRARYJSONSERVICE"
-    ]._serialized_start = 1420
+    ]._serialized_start = 1872
     _globals[
         "_ARBITRARYJSONSERVICE"
-    ]._serialized_end = 1527
+    ]._serialized_end = 1979
 # @@protoc_insertion_point(module_scope)
@@ -26,6 +26,11 @@ class CityCafeServiceStub(object):
             request_serializer=proto_dot_main__service__pb2.SearchCafesByQueryPerCityRequest.SerializeToString,
             response_deserializer=proto_dot_main__service__pb2.SearchCafesByQueryPerCityResponse.FromString,
         )
+        self.SuggestCafes = channel.unary_unary(
+            "/main.CityCafeService/SuggestCafes",
+            request_serializer=proto_dot_main__service__pb2.SuggestCafesRequest.SerializeToString,
+            response_deserializer=proto_dot_main__service__pb2.SuggestCafesResponse.FromString,
+        )
 
 
 class CityCafeServiceServicer(object):
@@ -57,6 +62,18 @@ class CityCafeServiceServicer(object):
             "Method not implemented!"
         )
 
+    def SuggestCafes(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(
+            grpc.StatusCode.UNIMPLEMENTED
+        )
+        context.set_details(
+            "Method not implemented!"
+        )
+        raise NotImplementedError(
+            "Method not implemented!"
+        )
+
 
 def add_CityCafeServiceServicer_to_server(
     servicer, server
@@ -72,6 +89,11 @@ def add_CityCafeServiceServicer_to_server(
             request_deserializer=proto_dot_main__service__pb2.SearchCafesByQueryPerCityRequest.FromString,
             response_serializer=proto_dot_main__service__pb2.SearchCafesByQueryPerCityResponse.SerializeToString,
         ),
+        "SuggestCafes": grpc.unary_unary_rpc_method_handler(
+            servicer.SuggestCafes,
+            request_deserializer=proto_dot_main__service__pb2.SuggestCafesRequest.FromString,
+            response_serializer=proto_dot_main__service__pb2.SuggestCafesResponse.SerializeToString,
+        ),
     }
     generic_handler = (
         grpc.method_handlers_generic_handler(
@@ -146,6 +168,35 @@ class CityCafeService(object):
             metadata,
         )
 
+    @staticmethod
+    def SuggestCafes(
+        request,
+        target,
+        options=(),
+        channel_credentials=None,
+        call_credentials=None,
+        insecure=False,
+        compression=None,
+        wait_for_ready=None,
+        timeout=None,
+        metadata=None,
+    ):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            "/main.CityCafeService/SuggestCafes",
+            proto_dot_main__service__pb2.SuggestCafesRequest.SerializeToString,
+            proto_dot_main__service__pb2.SuggestCafesResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+        )
+
 
 class ArbitraryJSONServiceStub(object):
     """Missing associated documentation comment in .proto file."""
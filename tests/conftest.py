@@ -0,0 +1,10 @@
+import os
+
+# Importing app reads its settings, nothing in the tests connects to these.
+os.environ.setdefault(
+    "POSTGRES_URL",
+    "postgresql+asyncpg://localhost/coffeegis",
+)
+os.environ.setdefault(
+    "REDIS_URL", "redis://localhost:6379"
+)
@@ -0,0 +1,50 @@
+import random
+
+import pytest
+
+from app.cursors import (
+    decode_cursor,
+    encode_cursor,
+)
+
+
+def test_round_trip():
+    rng = random.Random(0)
+    cases = [
+        (0.0, "a"),
+        (1e-9, "cafe:with:colons"),
+        (12.345678, "кофейня"),
+        (20037.5, "x" * 100),
+    ] + [
+        (
+            rng.uniform(0, 50),
+            "".join(
+                chr(rng.randint(33, 0x44F))
+                for _ in range(rng.randint(1, 20))
+            ),
+        )
+        for _ in range(500)
+    ]
+    for distance, cafe_id in cases:
+        cursor = encode_cursor(distance, cafe_id)
+        assert "=" not in cursor
+        # Exact, so the next page starts right after the last row.
+        assert decode_cursor(cursor) == (
+            distance,
+            cafe_id,
+        )
+
+
+@pytest.mark.parametrize(
+    "cursor",
+    [
+        "",
+        "not base64!",
+        encode_cursor(1.5, "a")[:-3],
+        "MTIz",
+        "//79",
+    ],
+)
+def test_malformed(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
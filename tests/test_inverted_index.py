@@ -0,0 +1,225 @@
+import math
+import random
+
+import pytest
+
+from textutils import InvertedIndex
+from textutils.inverted_index import (
+    B,
+    K1,
+    MIN_SIMILARITY,
+    PREFIX_WEIGHT,
+    TRIGRAM_WEIGHT,
+    trigrams,
+)
+
+FIELDS = {"name": 3.0, "address": 1.0}
+# Fewer words than MAX_EXPANSIONS, so no expansion is ever cut off.
+WORDS = [
+    "kofe",
+    "kofemania",
+    "coffee",
+    "coffeemania",
+    "cafe",
+    "tverskaya",
+    "tverskoy",
+    "ulitsa",
+    "prospekt",
+    "mira",
+    "dom",
+    "drinkit",
+    "double",
+    "b",
+]
+
+
+def brute_expand(vocabulary, token):
+    expanded = {}
+    if token in vocabulary:
+        expanded[token] = 1.0
+    for term in sorted(vocabulary):
+        if term.startswith(token):
+            expanded.setdefault(
+                term, PREFIX_WEIGHT
+            )
+    grams = trigrams(token)
+    for term in vocabulary:
+        similarity = len(
+            grams & trigrams(term)
+        ) / len(grams | trigrams(term))
+        if similarity >= MIN_SIMILARITY:
+            expanded.setdefault(
+                term, TRIGRAM_WEIGHT * similarity
+            )
+    return expanded
+
+
+def brute_search(documents, text):
+    """BM25 computed from the documents themselves on every call."""
+    tokens = {
+        field: {
+            cafe_id: (
+                document.get(field) or ""
+            ).split()
+            for cafe_id, document in documents.items()
+        }
+        for field in FIELDS
+    }
+    vocabulary = {
+        term
+        for by_id in tokens.values()
+        for terms in by_id.values()
+        for term in terms
+    }
+    total = len(documents)
+    scores = {}
+    for token in set(text.split()):
+        for term, weight in brute_expand(
+            vocabulary, token
+        ).items():
+            for field, boost in FIELDS.items():
+                by_id = tokens[field]
+                matching = [
+                    cafe_id
+                    for cafe_id, terms in by_id.items()
+                    if term in terms
+                ]
+                if not matching:
+                    continue
+                idf = math.log(
+                    1
+                    + (
+                        total
+                        - len(matching)
+                        + 0.5
+                    )
+                    / (len(matching) + 0.5)
+                )
+                average = (
+                    sum(map(len, by_id.values()))
+                    / total
+                )
+                for cafe_id in matching:
+                    frequency = by_id[
+                        cafe_id
+                    ].count(term)
+                    norm = K1 * (
+                        1
+                        - B
+                        + B
+                        * len(by_id[cafe_id])
+                        / average
+                    )
+                    scores[cafe_id] = scores.get(
+                        cafe_id, 0
+                    ) + (
+                        boost
+                        * weight
+                        * idf
+                        * frequency
+                        * (K1 + 1)
+                        / (frequency + norm)
+                    )
+    return scores
+
+
+def random_text(rng):
+    return " ".join(
+        rng.choice(WORDS)
+        for _ in range(rng.randint(0, 4))
+    )
+
+
+def random_query(rng):
+    word = rng.choice(WORDS)
+    roll = rng.random()
+    if roll < 0.3:
+        # Unfinished word.
+        word = word[: rng.randint(1, len(word))]
+    elif roll < 0.6:
+        # Typo.
+        i = rng.randrange(len(word))
+        word = (
+            word[:i]
+            + rng.choice("aeko")
+            + word[i + 1 :]
+        )
+    return f"{word} {rng.choice(WORDS)}"
+
+
+def test_search_matches_brute_force():
+    rng = random.Random(0)
+    index = InvertedIndex(FIELDS)
+    documents = {}
+    for _ in range(400):
+        cafe_id = str(rng.randrange(30))
+        if rng.random() < 0.25:
+            index.remove(cafe_id)
+            documents.pop(cafe_id, None)
+        else:
+            document = {
+                "id": cafe_id,
+                "name": random_text(rng),
+                "address": random_text(rng),
+            }
+            index.upsert(document)
+            documents[cafe_id] = document
+        assert len(index) == len(documents)
+        query = random_query(rng)
+        expected = brute_search(documents, query)
+        scores = index.search(query)
+        assert set(scores) == set(expected)
+        for cafe_id, score in expected.items():
+            assert scores[
+                cafe_id
+            ] == pytest.approx(score)
+
+
+def test_expand_matches_brute_force():
+    rng = random.Random(1)
+    index = InvertedIndex(FIELDS)
+    documents = [
+        {
+            "id": str(i),
+            "name": random_text(rng),
+            "address": random_text(rng),
+        }
+        for i in range(20)
+    ]
+    index.build(documents)
+    vocabulary = {
+        term
+        for document in documents
+        for field in FIELDS
+        for term in document[field].split()
+    }
+    for _ in range(200):
+        token = random_query(rng).split()[0]
+        assert index.expand(
+            token
+        ) == pytest.approx(
+            brute_expand(vocabulary, token)
+        )
+
+
+def test_removed_terms_are_forgotten():
+    index = InvertedIndex(FIELDS)
+    index.upsert(
+        {
+            "id": "1",
+            "name": "kofemania",
+            "address": "",
+        }
+    )
+    index.upsert(
+        {
+            "id": "1",
+            "name": "drinkit",
+            "address": None,
+        }
+    )
+    assert index.search("kofemania") == {}
+    assert index.expand("kofe") == {}
+    index.remove("1")
+    assert "1" not in index
+    assert index.search("drinkit") == {}
@@ -0,0 +1,180 @@
+import random
+
+import numpy as np
+
+from geoutils import (
+    CoordinatesProcessor,
+    SpatialIndex,
+)
+
+CENTRE = (55.75, 37.62)
+
+
+def random_rows(rng, n):
+    rows = []
+    for i in range(n):
+        if rows and rng.random() < 0.2:
+            # Same building as an earlier cafe, tied on distance.
+            lat, lon, _ = rng.choice(rows)
+        else:
+            lat = CENTRE[0] + rng.uniform(
+                -0.05, 0.05
+            )
+            lon = CENTRE[1] + rng.uniform(
+                -0.08, 0.08
+            )
+        rows.append((lat, lon, f"cafe{i:04d}"))
+    return rows
+
+
+def brute_sorted(rows, lat, lon):
+    distances = np.round(
+        CoordinatesProcessor.distances_from(
+            lat,
+            lon,
+            [row[0] for row in rows],
+            [row[1] for row in rows],
+        ),
+        6,
+    )
+    return sorted(
+        (float(distance), row[2])
+        for distance, row in zip(distances, rows)
+    )
+
+
+def random_point(rng):
+    return (
+        CENTRE[0] + rng.uniform(-0.06, 0.06),
+        CENTRE[1] + rng.uniform(-0.1, 0.1),
+    )
+
+
+def test_nearest_pages_match_brute_force():
+    rng = random.Random(0)
+    rows = random_rows(rng, 300)
+    index = SpatialIndex()
+    index.build(rows)
+    for _ in range(30):
+        lat, lon = random_point(rng)
+        expected = brute_sorted(rows, lat, lon)
+        k = rng.randint(1, 25)
+        pages, after = [], None
+        while len(pages) < len(expected):
+            page = index.nearest(
+                lat, lon, k, after
+            )
+            assert page
+            pages += page
+            after = page[-1]
+        assert pages == expected
+        assert (
+            index.nearest(lat, lon, k, after)
+            == []
+        )
+
+
+def test_within_matches_brute_force():
+    rng = random.Random(1)
+    rows = random_rows(rng, 300)
+    index = SpatialIndex()
+    index.build(rows)
+    for _ in range(50):
+        lat, lon = random_point(rng)
+        radius = rng.uniform(0.1, 4)
+        k = rng.randint(1, 40)
+        expected = [
+            hit
+            for hit in brute_sorted(
+                rows, lat, lon
+            )
+            if hit[0] <= radius
+        ]
+        assert (
+            index.within(lat, lon, radius, k)
+            == expected[:k]
+        )
+        if len(expected) > k:
+            assert (
+                index.within(
+                    lat,
+                    lon,
+                    radius,
+                    k,
+                    after=expected[k - 1],
+                )
+                == expected[k : 2 * k]
+            )
+
+
+def test_cover_contains_every_top_k():
+    rng = random.Random(2)
+    rows = random_rows(rng, 300)
+    index = SpatialIndex()
+    index.build(rows)
+    for _ in range(20):
+        lat, lon = random_point(rng)
+        bounds = (
+            lat,
+            lon,
+            lat + rng.uniform(0.001, 0.02),
+            lon + rng.uniform(0.001, 0.03),
+        )
+        k = rng.randint(1, 20)
+        covered = set(index.cover(bounds, k)[0])
+        for _ in range(20):
+            user_lat = rng.uniform(
+                bounds[0], bounds[2]
+            )
+            user_lon = rng.uniform(
+                bounds[1], bounds[3]
+            )
+            top = brute_sorted(
+                rows, user_lat, user_lon
+            )[:k]
+            # Whole tie groups at the k-th distance must be there.
+            kth = top[-1][0]
+            assert {
+                cafe_id
+                for distance, cafe_id in brute_sorted(
+                    rows, user_lat, user_lon
+                )
+                if distance <= kth
+            } <= covered
+
+
+def test_update_matches_rebuild():
+    rng = random.Random(3)
+    rows = random_rows(rng, 200)
+    index = SpatialIndex()
+    index.build(rows)
+    current = {row[2]: row for row in rows}
+    for _ in range(10):
+        moved = [
+            (*random_point(rng), cafe_id)
+            for cafe_id in rng.sample(
+                sorted(current), 5
+            )
+        ]
+        # Disjoint, as apply_cafe_changes passes them.
+        removed = rng.sample(
+            sorted(
+                current.keys()
+                - {row[2] for row in moved}
+            ),
+            3,
+        )
+        index.update(moved, removed=removed)
+        current.update(
+            (row[2], row) for row in moved
+        )
+        for cafe_id in removed:
+            current.pop(cafe_id)
+        assert len(index) == len(current)
+        lat, lon = random_point(rng)
+        assert (
+            index.nearest(lat, lon, 10)
+            == brute_sorted(
+                list(current.values()), lat, lon
+            )[:10]
+        )
@@ -0,0 +1,90 @@
+import random
+
+from textutils import RadixTrie
+
+
+def brute_top(entries, prefix, k):
+    return sorted(
+        (
+            (weight, key, value)
+            for key, (
+                weight,
+                value,
+            ) in entries.items()
+            if key.startswith(prefix)
+        ),
+        key=lambda entry: (-entry[0], entry[1]),
+    )[:k]
+
+
+def random_key(rng):
+    # A tiny alphabet, so keys share prefixes and split edges often.
+    return "".join(
+        rng.choice("abc")
+        for _ in range(rng.randint(0, 6))
+    )
+
+
+def test_top_matches_brute_force():
+    rng = random.Random(0)
+    trie = RadixTrie(cache_size=4)
+    entries = {}
+    for step in range(3000):
+        key = random_key(rng)
+        if rng.random() < 0.3:
+            assert trie.remove(key) == (
+                entries.pop(key, None) is not None
+            )
+        else:
+            # Few distinct weights, so ties are broken by key.
+            weight = rng.randint(0, 3)
+            trie.insert(key, step, weight)
+            entries[key] = (weight, step)
+        assert len(trie) == len(entries)
+        prefix = random_key(rng)[:3]
+        for k in (1, 4, 10):
+            assert trie.top(
+                prefix, k
+            ) == brute_top(entries, prefix, k)
+
+
+def test_get_and_contains():
+    rng = random.Random(1)
+    trie = RadixTrie()
+    entries = {}
+    for step in range(500):
+        key = random_key(rng)
+        if rng.random() < 0.3:
+            trie.remove(key)
+            entries.pop(key, None)
+        else:
+            trie.insert(key, step, 1)
+            entries[key] = step
+    for _ in range(200):
+        key = random_key(rng)
+        assert (key in trie) == (key in entries)
+        entry = trie.get(key)
+        assert (
+            entry[2] if entry else None
+        ) == entries.get(key)
+
+
+def test_remove_merges_edges():
+    trie = RadixTrie()
+    trie.insert("coffee", "a", 1)
+    trie.insert("coffeemania", "b", 2)
+    trie.insert("cofix", "c", 3)
+    assert trie.remove("coffee")
+    assert not trie.remove("coffee")
+    assert not trie.remove("cof")
+    assert [
+        key for _, key, _ in trie.top("c", 5)
+    ] == [
+        "cofix",
+        "coffeemania",
+    ]
+    assert (
+        trie.top("coffeem", 5)[0][1]
+        == "coffeemania"
+    )
+    assert trie.top("coffeex", 5) == []
@@ -0,0 +1,4 @@
+from textutils.inverted_index import (
+    InvertedIndex,
+)
+from textutils.trie import RadixTrie
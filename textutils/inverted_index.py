@@ -0,0 +1,233 @@
+import math
+from bisect import bisect_left, insort
+from collections import Counter, defaultdict
+from typing import Dict, Iterable
+
+K1 = 1.2
+B = 0.75
+# Weights of a query term expanded to an indexed term it is a prefix of,
+# or one it only shares trigrams with.
+PREFIX_WEIGHT = 0.75
+TRIGRAM_WEIGHT = 0.5
+MIN_SIMILARITY = 0.3
+MAX_EXPANSIONS = 32
+
+
+def trigrams(term: str) -> set:
+    padded = f"  {term} "
+    return {
+        padded[i : i + 3]
+        for i in range(len(padded) - 2)
+    }
+
+
+class InvertedIndex:
+    """In-memory BM25 index over the text fields of cafe documents.
+
+    Documents are searched by their `id` and carry any other keys along
+    untouched. Query terms also match indexed terms they are a prefix of
+    or that share enough trigrams with them, so typos and unfinished words
+    still find something, as the prefix and trigram subfields do in
+    Elasticsearch.
+    """
+
+    def __init__(self, fields: Dict[str, float]):
+        self.fields = fields
+        self.clear()
+
+    def clear(self):
+        self.documents = {}
+        # field -> term -> cafe_id -> term frequency
+        self._postings = {
+            field: defaultdict(dict)
+            for field in self.fields
+        }
+        self._lengths = {
+            field: {} for field in self.fields
+        }
+        self._total_lengths = dict.fromkeys(
+            self.fields, 0
+        )
+        # Number of (document, field) pairs each term occurs in.
+        self._term_counts = Counter()
+        self._vocabulary = []
+        self._trigrams = defaultdict(set)
+
+    def __len__(self):
+        return len(self.documents)
+
+    def __contains__(self, cafe_id):
+        return cafe_id in self.documents
+
+    @staticmethod
+    def tokenize(text) -> list:
+        return (text or "").split()
+
+    def build(self, documents: Iterable[dict]):
+        self.clear()
+        for document in documents:
+            self.upsert(document)
+
+    def upsert(self, document: dict):
+        cafe_id = document["id"]
+        self.remove(cafe_id)
+        self.documents[cafe_id] = document
+        for field in self.fields:
+            tokens = self.tokenize(
+                document.get(field)
+            )
+            self._lengths[field][cafe_id] = len(
+                tokens
+            )
+            self._total_lengths[field] += len(
+                tokens
+            )
+            for term, count in Counter(
+                tokens
+            ).items():
+                self._postings[field][term][
+                    cafe_id
+                ] = count
+                self._add_term(term)
+
+    def remove(self, cafe_id: str):
+        document = self.documents.pop(
+            cafe_id, None
+        )
+        if document is None:
+            return
+        for field in self.fields:
+            self._total_lengths[
+                field
+            ] -= self._lengths[field].pop(cafe_id)
+            postings = self._postings[field]
+            for term in set(
+                self.tokenize(document.get(field))
+            ):
+                del postings[term][cafe_id]
+                if not postings[term]:
+                    del postings[term]
+                self._remove_term(term)
+
+    def _add_term(self, term: str):
+        self._term_counts[term] += 1
+        if self._term_counts[term] > 1:
+            return
+        insort(self._vocabulary, term)
+        for gram in trigrams(term):
+            self._trigrams[gram].add(term)
+
+    def _remove_term(self, term: str):
+        self._term_counts[term] -= 1
+        if self._term_counts[term]:
+            return
+        del self._term_counts[term]
+        del self._vocabulary[
+            bisect_left(self._vocabulary, term)
+        ]
+        for gram in trigrams(term):
+            self._trigrams[gram].discard(term)
+            if not self._trigrams[gram]:
+                del self._trigrams[gram]
+
+    def expand(
+        self, token: str
+    ) -> Dict[str, float]:
+        """Indexed terms `token` may stand for, with their weights."""
+        expanded = {}
+        if token in self._term_counts:
+            expanded[token] = 1.0
+        start = bisect_left(
+            self._vocabulary, token
+        )
+        for term in self._vocabulary[
+            start : start + MAX_EXPANSIONS
+        ]:
+            if not term.startswith(token):
+                break
+            expanded.setdefault(
+                term, PREFIX_WEIGHT
+            )
+
+        grams = trigrams(token)
+        shared = Counter(
+            term
+            for gram in grams
+            for term in self._trigrams.get(
+                gram, ()
+            )
+        )
+        similar = {}
+        for term, count in shared.items():
+            similarity = count / (
+                len(grams)
+                + len(trigrams(term))
+                - count
+            )
+            if similarity >= MIN_SIMILARITY:
+                similar[term] = (
+                    TRIGRAM_WEIGHT * similarity
+                )
+        for term in sorted(
+            similar, key=similar.get, reverse=True
+        )[:MAX_EXPANSIONS]:
+            expanded.setdefault(
+                term, similar[term]
+            )
+        return expanded
+
+    def search(
+        self, text: str
+    ) -> Dict[str, float]:
+        """BM25 score of every document matching any term of `text`."""
+        scores = defaultdict(float)
+        total = len(self.documents)
+        if not total:
+            return scores
+        for token in set(self.tokenize(text)):
+            for term, weight in self.expand(
+                token
+            ).items():
+                for (
+                    field,
+                    boost,
+                ) in self.fields.items():
+                    postings = self._postings[
+                        field
+                    ].get(term)
+                    if not postings:
+                        continue
+                    idf = math.log(
+                        1
+                        + (
+                            total
+                            - len(postings)
+                            + 0.5
+                        )
+                        / (len(postings) + 0.5)
+                    )
+                    average = (
+                        self._total_lengths[field]
+                        / total
+                    )
+                    lengths = self._lengths[field]
+                    for (
+                        cafe_id,
+                        frequency,
+                    ) in postings.items():
+                        norm = K1 * (
+                            1
+                            - B
+                            + B
+                            * lengths[cafe_id]
+                            / average
+                        )
+                        scores[cafe_id] += (
+                            boost
+                            * weight
+                            * idf
+                            * frequency
+                            * (K1 + 1)
+                            / (frequency + norm)
+                        )
+        return scores
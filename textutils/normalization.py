@@ -0,0 +1,201 @@
+import re
+from typing import Iterable, List, Optional
+
+# Joins texts for cleaning in one pass, Postgres text cannot contain it.
+SEPARATOR = "\0"
+
+
+class CleanTable(dict):
+    """str.translate table behind clean_string.
+
+    Latin and Cyrillic letters are lowercased, with ё folded to е, digits,
+    hyphens and spaces kept and anything else turned into a space.
+    Characters past the prefilled ranges are decided once, when first met.
+    """
+
+    def __missing__(self, code: int) -> str:
+        char = chr(code)
+        if char in "ёЁ":
+            value = "е"
+        elif (
+            "a" <= char <= "z"
+            or "A" <= char <= "Z"
+            or "а" <= char <= "я"
+            or "А" <= char <= "Я"
+        ):
+            value = char.lower()
+        elif (
+            char.isdecimal()
+            or char in "- " + SEPARATOR
+        ):
+            value = char
+        else:
+            value = " "
+        self[code] = value
+        return value
+
+
+CLEAN_TABLE = CleanTable()
+for code in range(0x500):
+    CLEAN_TABLE[code]
+
+# Street types as they are abbreviated in addresses, Cyrillic and Latin.
+ABBREVIATIONS = {
+    "ул": "улица",
+    "пр": "проспект",
+    "пр-т": "проспект",
+    "пр-кт": "проспект",
+    "просп": "проспект",
+    "пр-д": "проезд",
+    "пер": "переулок",
+    "б-р": "бульвар",
+    "бул": "бульвар",
+    "наб": "набережная",
+    "пл": "площадь",
+    "ш": "шоссе",
+    "туп": "тупик",
+    "мкр": "микрорайон",
+    "ul": "ulitsa",
+    "pr": "prospekt",
+    "pr-t": "prospekt",
+    "prosp": "prospekt",
+    "per": "pereulok",
+    "bul": "bulvar",
+    "nab": "naberezhnaya",
+    "pl": "ploshchad",
+    "sh": "shosse",
+}
+
+CYRILLIC_TO_LATIN = str.maketrans(
+    {
+        "а": "a",
+        "б": "b",
+        "в": "v",
+        "г": "g",
+        "д": "d",
+        "е": "e",
+        "ё": "e",
+        "ж": "zh",
+        "з": "z",
+        "и": "i",
+        "й": "y",
+        "к": "k",
+        "л": "l",
+        "м": "m",
+        "н": "n",
+        "о": "o",
+        "п": "p",
+        "р": "r",
+        "с": "s",
+        "т": "t",
+        "у": "u",
+        "ф": "f",
+        "х": "kh",
+        "ц": "ts",
+        "ч": "ch",
+        "ш": "sh",
+        "щ": "shch",
+        "ъ": "",
+        "ы": "y",
+        "ь": "",
+        "э": "e",
+        "ю": "yu",
+        "я": "ya",
+    }
+)
+
+# Spellings that romanizations and English borrowings disagree on,
+# folded to one. Longer digraphs are listed, and so matched, first.
+LATIN_DIGRAPHS = {
+    "shch": "sh",
+    "sch": "sh",
+    "ck": "k",
+    "ph": "f",
+    "kh": "h",
+    "ts": "c",
+    "tz": "c",
+    "yo": "e",
+    "ye": "e",
+    "x": "ks",
+}
+LATIN_DIGRAPHS_PATTERN = re.compile(
+    "|".join(
+        sorted(
+            LATIN_DIGRAPHS, key=len, reverse=True
+        )
+    )
+)
+# A "c" that is not a "ts" sound is a "k".
+HARD_C_PATTERN = re.compile(r"c(?![eihy])")
+LATIN_LETTERS = str.maketrans("ywqj", "ivki")
+DOUBLED_PATTERN = re.compile(r"(.)\1+")
+
+
+def expand_abbreviations(
+    text: str, partial: bool = False
+) -> str:
+    """Spell out street types in cleaned, lowercase text.
+
+    With `partial` the last word is still being typed and is left alone.
+    """
+    words = text.split()
+    last = (
+        words.pop() if partial and words else None
+    )
+    words = [
+        ABBREVIATIONS.get(word, word)
+        for word in words
+    ]
+    if last is not None:
+        words.append(last)
+    return " ".join(words)
+
+
+def clean_string(
+    input_string: Optional[str],
+    partial: bool = False,
+) -> str:
+    """Normalized form of text, as it is indexed and searched for."""
+    return expand_abbreviations(
+        (input_string or "").translate(
+            CLEAN_TABLE
+        ),
+        partial,
+    )
+
+
+def clean_strings(
+    strings: Iterable[Optional[str]],
+) -> List[str]:
+    """clean_string of many texts, translated in a single pass."""
+    strings = list(strings)
+    if not strings:
+        return []
+    return [
+        expand_abbreviations(cleaned)
+        for cleaned in SEPARATOR.join(
+            string or "" for string in strings
+        )
+        .translate(CLEAN_TABLE)
+        .split(SEPARATOR)
+    ]
+
+
+def transliterate(text: str) -> str:
+    return text.translate(CYRILLIC_TO_LATIN)
+
+
+def latin_key(text: str) -> str:
+    """Spelling-insensitive Latin form of cleaned, lowercase text.
+
+    "кофемания" and "coffeemania" both become "kofemania", "тверская"
+    and "tverskaya" both "tverskaia".
+    """
+    text = LATIN_DIGRAPHS_PATTERN.sub(
+        lambda match: LATIN_DIGRAPHS[match[0]],
+        transliterate(text),
+    )
+    text = HARD_C_PATTERN.sub(
+        "k", text
+    ).translate(LATIN_LETTERS)
+    return DOUBLED_PATTERN.sub(r"\1", text)
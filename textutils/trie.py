@@ -0,0 +1,193 @@
+import heapq
+from itertools import chain
+from typing import Any, List, Optional, Tuple
+
+Entry = Tuple[float, str, Any]
+
+
+def rank(entry: Entry):
+    weight, key, _ = entry
+    return -weight, key
+
+
+class Node:
+    __slots__ = (
+        "label",
+        "children",
+        "entry",
+        "best",
+    )
+
+    def __init__(self, label: str = ""):
+        self.label = label
+        self.children = {}
+        self.entry: Optional[Entry] = None
+        # Heaviest entries of the subtree, kept until it changes.
+        self.best: Optional[List[Entry]] = None
+
+
+class RadixTrie:
+    """Compressed trie of weighted string keys answering top-k by prefix.
+
+    Chains of single-child nodes share one edge, and every node caches
+    the `cache_size` heaviest entries below it, so completing a prefix
+    costs a walk down the prefix once the cache is warm. Writes drop the
+    caches along their path only.
+    """
+
+    def __init__(self, cache_size: int = 64):
+        self.cache_size = cache_size
+        self.root = Node()
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def __contains__(self, key: str):
+        return self.get(key) is not None
+
+    def get(self, key: str) -> Optional[Entry]:
+        node = self.root
+        while key:
+            child = node.children.get(key[0])
+            if (
+                child is None
+                or not key.startswith(child.label)
+            ):
+                return None
+            key = key[len(child.label) :]
+            node = child
+        return node.entry
+
+    def insert(
+        self, key: str, value: Any, weight: float
+    ):
+        node, rest = self.root, key
+        node.best = None
+        while rest:
+            child = node.children.get(rest[0])
+            if child is None:
+                child = Node(rest)
+                node.children[rest[0]] = child
+                node, rest = child, ""
+                break
+            common = 0
+            limit = min(
+                len(child.label), len(rest)
+            )
+            while (
+                common < limit
+                and child.label[common]
+                == rest[common]
+            ):
+                common += 1
+            if common < len(child.label):
+                # Split the edge where the keys part.
+                middle = Node(
+                    child.label[:common]
+                )
+                child.label = child.label[common:]
+                middle.children[
+                    child.label[0]
+                ] = child
+                node.children[rest[0]] = middle
+                child = middle
+            child.best = None
+            node, rest = child, rest[common:]
+        if node.entry is None:
+            self._size += 1
+        node.entry = (weight, key, value)
+
+    def remove(self, key: str) -> bool:
+        path = [self.root]
+        rest = key
+        while rest:
+            child = path[-1].children.get(rest[0])
+            if (
+                child is None
+                or not rest.startswith(
+                    child.label
+                )
+            ):
+                return False
+            rest = rest[len(child.label) :]
+            path.append(child)
+        node = path[-1]
+        if node.entry is None:
+            return False
+        node.entry = None
+        self._size -= 1
+        for visited in path:
+            visited.best = None
+
+        # Prune the emptied branch and merge what is left of it.
+        for parent, child in zip(
+            reversed(path[:-1]),
+            reversed(path[1:]),
+        ):
+            if child.entry is not None:
+                break
+            if not child.children:
+                del parent.children[
+                    child.label[0]
+                ]
+                continue
+            if len(child.children) == 1:
+                (grandchild,) = (
+                    child.children.values()
+                )
+                grandchild.label = (
+                    child.label + grandchild.label
+                )
+                parent.children[
+                    child.label[0]
+                ] = grandchild
+            break
+        return True
+
+    def _best(self, node: Node) -> List[Entry]:
+        if node.best is None:
+            node.best = heapq.nsmallest(
+                self.cache_size,
+                chain(
+                    (
+                        (node.entry,)
+                        if node.entry
+                        else ()
+                    ),
+                    *(
+                        self._best(child)
+                        for child in node.children.values()
+                    ),
+                ),
+                key=rank,
+            )
+        return node.best
+
+    def _entries(self, node: Node):
+        if node.entry is not None:
+            yield node.entry
+        for child in node.children.values():
+            yield from self._entries(child)
+
+    def top(
+        self, prefix: str, k: int
+    ) -> List[Entry]:
+        """The k heaviest (weight, key, value) entries under `prefix`."""
+        node, rest = self.root, prefix
+        while rest:
+            child = node.children.get(rest[0])
+            if child is None:
+                return []
+            if child.label.startswith(rest):
+                node, rest = child, ""
+            elif rest.startswith(child.label):
+                node = child
+                rest = rest[len(child.label) :]
+            else:
+                return []
+        if k <= self.cache_size:
+            return self._best(node)[:k]
+        return heapq.nsmallest(
+            k, self._entries(node), key=rank
+        )
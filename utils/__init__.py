@@ -1 +1,7 @@
-from utils.redis_wrapper import RedisWrapper
+from utils.local_cache import LocalCache
+from utils.redis_wrapper import (
+    CacheControl,
+    CachePolicy,
+    RedisWrapper,
+)
+from utils.single_flight import SingleFlight
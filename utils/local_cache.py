@@ -0,0 +1,72 @@
+import time
+from collections import OrderedDict
+from typing import Optional
+
+
+class LocalCache:
+    """Bounded in-process LRU for Redis values, with per-key expiry."""
+
+    def __init__(
+        self,
+        max_items: int = 4096,
+        max_bytes: int = 64 * 1024 * 1024,
+    ):
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key) -> Optional[bytes]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            self.delete(key)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key, value: bytes, ttl: float):
+        self.delete(key)
+        size = len(value)
+        if ttl <= 0 or size > self.max_bytes:
+            return
+        self._entries[key] = (
+            time.monotonic() + ttl,
+            value,
+        )
+        self._bytes += size
+        while (
+            len(self._entries) > self.max_items
+            or self._bytes > self.max_bytes
+        ):
+            _, (_, evicted) = (
+                self._entries.popitem(last=False)
+            )
+            self._bytes -= len(evicted)
+
+    def delete(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= len(entry[1])
+
+    def clear(self):
+        self._entries.clear()
+        self._bytes = 0
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "items": len(self._entries),
+            "bytes": self._bytes,
+        }
@@ -1,21 +1,494 @@
+import asyncio
+import hashlib
+import json
+import logging
+import math
+import random
+import struct
+import time
+from dataclasses import dataclass
+from typing import (
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Tuple,
+)
+
 import redis.asyncio as aioredis
+from redis.exceptions import LockError
+
+from utils.local_cache import LocalCache
+from utils.single_flight import SingleFlight
+
+# Entries written through get_or_set carry a soft expiry in front of the
+# payload: a marker byte followed by the wall-clock deadline as a double.
+_ENTRY_HEADER = struct.Struct(">cd")
+_ENTRY_MARKER = b"\x01"
+
+INVALIDATION_CHANNEL = "cache:invalidations"
+
+
+@dataclass(frozen=True)
+class CachePolicy:
+    """Lifetimes of one key family.
+
+    An entry is fresh for `ttl` seconds, then served stale for up to
+    `stale_ttl` more while a background task refreshes it. Both are
+    stretched by a random factor within +/- `jitter` so keys written
+    together do not expire together.
+    """
+
+    ttl: float
+    stale_ttl: float = 0
+    jitter: float = 0
+
+    def lifetimes(self) -> Tuple[float, int]:
+        fresh = self.ttl * random.uniform(
+            1 - self.jitter, 1 + self.jitter
+        )
+        return fresh, math.ceil(
+            fresh + self.stale_ttl
+        )
+
+
+@dataclass(frozen=True)
+class CacheControl:
+    """Per-request overrides of a CachePolicy.
+
+    `bypass` ignores cached entries and stores what the loader returns,
+    without evicting anything in the meantime. `max_staleness` caps how
+    many seconds past their fresh lifetime entries may still be served;
+    staler ones are reloaded before returning.
+    """
+
+    bypass: bool = False
+    max_staleness: Optional[float] = None
+
+    def too_stale(
+        self, fresh_until: float, now: float
+    ) -> bool:
+        return (
+            self.max_staleness is not None
+            and now - fresh_until
+            > self.max_staleness
+        )
+
+
+DEFAULT_CONTROL = CacheControl()
+
+
+def pack_entry(value: bytes, fresh_until: float):
+    return (
+        _ENTRY_HEADER.pack(
+            _ENTRY_MARKER, fresh_until
+        )
+        + value
+    )
+
+
+def unpack_entry(
+    raw: Optional[bytes],
+) -> Optional[Tuple[float, bytes]]:
+    if (
+        raw is None
+        or len(raw) < _ENTRY_HEADER.size
+        or raw[:1] != _ENTRY_MARKER
+    ):
+        return None
+    _, fresh_until = _ENTRY_HEADER.unpack_from(
+        raw
+    )
+    return fresh_until, raw[_ENTRY_HEADER.size :]
+
+
+def _as_bytes(value):
+    if isinstance(value, str):
+        return value.encode()
+    return (
+        value
+        if isinstance(value, bytes)
+        else None
+    )
 
 
 class RedisWrapper:
-    def __init__(self, redis_url: str):
+    def __init__(
+        self,
+        redis_url: str,
+        local: Optional[LocalCache] = None,
+        lock_timeout: float = 5,
+    ):
         self.r = aioredis.from_url(
             redis_url,
         )
+        self.local = local
+        self.lock_timeout = lock_timeout
+        self.flights = SingleFlight()
+        self._refreshing = set()
+        self._background = set()
+        self._generations: Dict[str, int] = {}
+
+    def _remember(self, name, value, ex):
+        value = _as_bytes(value)
+        if (
+            self.local is not None
+            and value is not None
+            and ex
+        ):
+            self.local.set(name, value, ex)
+
+    async def _fetch(self, name):
+        # Fetch the remaining TTL in the same round trip so the local
+        # copy never outlives the Redis one.
+        async with self.r.pipeline(
+            transaction=False
+        ) as pipe:
+            pipe.get(name)
+            pipe.pttl(name)
+            value, pttl = await pipe.execute()
+        if value is not None and pttl > 0:
+            self._remember(
+                name, value, pttl / 1000
+            )
+        return value
+
+    async def _fetch_many(self, names):
+        async with self.r.pipeline(
+            transaction=False
+        ) as pipe:
+            pipe.mget(names)
+            for name in names:
+                pipe.pttl(name)
+            fetched, *pttls = await pipe.execute()
+        found = {}
+        for name, value, pttl in zip(
+            names, fetched, pttls
+        ):
+            if value is not None and pttl > 0:
+                self._remember(
+                    name, value, pttl / 1000
+                )
+            found[name] = value
+        return found
 
     async def get(self, name):
-        return await self.r.get(name)
+        if self.local is None:
+            return await self.r.get(name)
+        if (
+            value := self.local.get(name)
+        ) is not None:
+            return value
+        return await self._fetch(name)
 
     async def set(
         self, name, value, ex, *args, **kwargs
     ):
-        return await self.r.set(
+        res = await self.r.set(
             name, value, ex, *args, **kwargs
         )
+        if self.local is not None:
+            self.local.delete(name)
+            if res and not args and not kwargs:
+                self._remember(name, value, ex)
+        return res
+
+    async def mget(self, names):
+        if self.local is None:
+            return await self.r.mget(names)
+
+        values = [
+            self.local.get(name) for name in names
+        ]
+        missing = [
+            name
+            for name, value in zip(names, values)
+            if value is None
+        ]
+        if not missing:
+            return values
+
+        found = await self._fetch_many(missing)
+        return [
+            (
+                value
+                if value is not None
+                else found[name]
+            )
+            for name, value in zip(names, values)
+        ]
+
+    async def set_entries(
+        self,
+        mapping: Dict[str, bytes],
+        policy: CachePolicy,
+    ):
+        if not mapping:
+            return
+        now = time.time()
+        entries = {}
+        async with self.r.pipeline(
+            transaction=False
+        ) as pipe:
+            for name, value in mapping.items():
+                fresh, ex = policy.lifetimes()
+                entries[name] = (
+                    pack_entry(
+                        value, now + fresh
+                    ),
+                    ex,
+                )
+                pipe.set(name, *entries[name])
+            await pipe.execute()
+        for name, (entry, ex) in entries.items():
+            self._remember(name, entry, ex)
+
+    async def get_or_set(
+        self,
+        name,
+        loader: Callable[
+            [], Awaitable[Optional[bytes]]
+        ],
+        policy: CachePolicy,
+        control: CacheControl = DEFAULT_CONTROL,
+    ):
+        """Cached value for `name`, computing it at most once at a time.
+
+        Concurrent misses in this process share one in-flight load, and a
+        short Redis lock keeps other replicas waiting for that result
+        instead of recomputing it. Stale entries are returned as is while
+        a refresh runs in the background. A loader returning None is not
+        cached.
+        """
+        if control.bypass:
+            value = await loader()
+            if value is not None:
+                await self.set_entries(
+                    {name: value}, policy
+                )
+            return value
+        if entry := unpack_entry(
+            await self.get(name)
+        ):
+            fresh_until, value = entry
+            now = time.time()
+            if control.too_stale(
+                fresh_until, now
+            ):
+                return await self.flights.do(
+                    name,
+                    lambda: self._load_locked(
+                        name, loader, policy
+                    ),
+                )
+            if fresh_until <= now:
+                self._refresh(
+                    name,
+                    lambda: self._load_locked(
+                        name, loader, policy
+                    ),
+                )
+            return value
+        return await self.flights.do(
+            name,
+            lambda: self._load_locked(
+                name, loader, policy
+            ),
+        )
+
+    async def get_many_or_set(
+        self,
+        names: List[str],
+        loader: Callable[
+            [List[str]],
+            Awaitable[Dict[str, Optional[bytes]]],
+        ],
+        policy: CachePolicy,
+        control: CacheControl = DEFAULT_CONTROL,
+    ) -> List[Optional[bytes]]:
+        """Batch get_or_set; `loader` maps missing names to values.
+
+        Misses are coalesced like in get_or_set, keyed by the whole set of
+        missing names.
+        """
+        if control.bypass:
+            loaded = await self._load_many(
+                names, loader, policy
+            )
+            return [
+                loaded.get(name) for name in names
+            ]
+        now = time.time()
+        values, missing, stale = [], [], []
+        for name, raw in zip(
+            names, await self.mget(names)
+        ):
+            entry = unpack_entry(raw)
+            if (
+                entry is None
+                or control.too_stale(
+                    entry[0], now
+                )
+            ):
+                missing.append(name)
+                values.append(None)
+                continue
+            fresh_until, value = entry
+            if fresh_until <= now:
+                stale.append(name)
+            values.append(value)
+
+        stale = [
+            name
+            for name in stale
+            if name not in self._refreshing
+        ]
+        if stale:
+            self._refresh(
+                tuple(stale),
+                lambda: self._load_many(
+                    stale, loader, policy
+                ),
+            )
+        if not missing:
+            return values
+
+        loaded = await self.flights.do(
+            tuple(sorted(missing)),
+            lambda: self._load_many_locked(
+                missing, loader, policy
+            ),
+        )
+        return [
+            (
+                value
+                if value is not None
+                else loaded.get(name)
+            )
+            for name, value in zip(names, values)
+        ]
+
+    async def _load_many(
+        self, names, loader, policy
+    ):
+        self._refreshing.update(names)
+        try:
+            loaded = await loader(names)
+            await self.set_entries(
+                {
+                    name: value
+                    for name, value in loaded.items()
+                    if value is not None
+                },
+                policy,
+            )
+            return loaded
+        finally:
+            self._refreshing.difference_update(
+                names
+            )
+
+    async def _load_many_locked(
+        self, names, loader, policy
+    ):
+        digest = hashlib.sha1(
+            "\0".join(sorted(names)).encode()
+        ).hexdigest()
+        lock = self.r.lock(
+            f"lock:many:{digest}",
+            timeout=self.lock_timeout,
+            blocking_timeout=self.lock_timeout,
+        )
+        acquired = await lock.acquire()
+        try:
+            # As in _load_locked, only what is still missing once the
+            # previous holder is done gets loaded.
+            now = time.time()
+            found = {}
+            for name, raw in (
+                await self._fetch_many(names)
+            ).items():
+                entry = unpack_entry(raw)
+                if entry and entry[0] > now:
+                    found[name] = entry[1]
+            missing = [
+                name
+                for name in names
+                if name not in found
+            ]
+            if missing:
+                found.update(
+                    await self._load_many(
+                        missing, loader, policy
+                    )
+                )
+            return found
+        finally:
+            if acquired:
+                try:
+                    await lock.release()
+                except LockError:
+                    pass
+
+    async def _load_locked(
+        self, name, loader, policy
+    ):
+        lock = self.r.lock(
+            f"lock:{name}",
+            timeout=self.lock_timeout,
+            blocking_timeout=self.lock_timeout,
+        )
+        acquired = await lock.acquire()
+        try:
+            # Whoever held the lock before us has most likely filled
+            # the key already. Ask Redis itself, the local copy may be
+            # the stale entry being refreshed.
+            if entry := unpack_entry(
+                await self._fetch(name)
+            ):
+                fresh_until, value = entry
+                if fresh_until > time.time():
+                    return value
+            value = await loader()
+            if value is not None:
+                await self.set_entries(
+                    {name: value}, policy
+                )
+            return value
+        finally:
+            if acquired:
+                try:
+                    await lock.release()
+                except LockError:
+                    # Expired while loading, someone else owns it now.
+                    pass
+
+    def _refresh(self, key, load):
+        if key in self.flights:
+            return
+        task = asyncio.create_task(
+            self.flights.do(key, load)
+        )
+        self._background.add(task)
+        task.add_done_callback(self._refreshed)
+
+    def _refreshed(self, task):
+        self._background.discard(task)
+        if (
+            not task.cancelled()
+            and task.exception()
+        ):
+            logging.error(
+                f"Background cache refresh failed: {task.exception()}"
+            )
+
+    def stats(self) -> dict:
+        return (
+            self.local.stats()
+            if self.local is not None
+            else {}
+        )
 
     async def hget(
         self,
@@ -36,7 +509,7 @@ class RedisWrapper:
         value,
         ex=3600,
         *args,
-        **kwargs
+        **kwargs,
     ):
         r = await self.r.hset(
             name, key, value, *args, **kwargs
@@ -44,5 +517,102 @@ class RedisWrapper:
         await self.r.expire(name, ex)
         return r
 
-    async def drop_cache(self, key):
-        await self.r.expire(key, 1)
+    async def generation(self, namespace) -> int:
+        """Current generation of `namespace`, to be embedded in its keys."""
+        if namespace not in self._generations:
+            value = await self.r.get(
+                f"generation:{namespace}"
+            )
+            self._generations[namespace] = int(
+                value or 0
+            )
+        return self._generations[namespace]
+
+    async def invalidate(self, *namespaces):
+        """Orphan every key of `namespaces` by bumping their generations.
+
+        Old entries are never read again and simply expire.
+        """
+        async with self.r.pipeline(
+            transaction=False
+        ) as pipe:
+            for namespace in namespaces:
+                pipe.incr(
+                    f"generation:{namespace}"
+                )
+            pipe.publish(
+                INVALIDATION_CHANNEL,
+                json.dumps(
+                    {"namespaces": namespaces}
+                ),
+            )
+            *generations, _ = await pipe.execute()
+        self._generations.update(
+            zip(namespaces, generations)
+        )
+
+    async def invalidate_keys(self, *names):
+        if not names:
+            return
+        async with self.r.pipeline(
+            transaction=False
+        ) as pipe:
+            pipe.delete(*names)
+            pipe.publish(
+                INVALIDATION_CHANNEL,
+                json.dumps({"keys": names}),
+            )
+            await pipe.execute()
+        self._forget_keys(names)
+
+    def _forget_keys(self, names):
+        if self.local is not None:
+            for name in names:
+                self.local.delete(name)
+
+    def _forget_all(self):
+        self._generations.clear()
+        if self.local is not None:
+            self.local.clear()
+
+    async def listen_invalidations(
+        self, retry_interval: float = 1
+    ):
+        """Apply invalidations published by any replica to local state.
+
+        Runs until cancelled. Everything local is dropped on every
+        (re)subscription, as messages sent while disconnected are lost.
+        """
+        while True:
+            try:
+                async with self.r.pubsub(
+                    ignore_subscribe_messages=True
+                ) as pubsub:
+                    await pubsub.subscribe(
+                        INVALIDATION_CHANNEL
+                    )
+                    self._forget_all()
+                    async for (
+                        message
+                    ) in pubsub.listen():
+                        data = json.loads(
+                            message["data"]
+                        )
+                        for namespace in data.get(
+                            "namespaces", ()
+                        ):
+                            self._generations.pop(
+                                namespace, None
+                            )
+                        self._forget_keys(
+                            data.get("keys", ())
+                        )
+            except Exception as e:
+                # Whatever ends the subscription, a dead listener would
+                # leave stale generations and local copies forever.
+                logging.error(
+                    f"Lost cache invalidation channel: {e}"
+                )
+                await asyncio.sleep(
+                    retry_interval
+                )
@@ -0,0 +1,39 @@
+import asyncio
+from typing import Awaitable, Callable, Dict
+
+
+class SingleFlight:
+    """Collapses concurrent calls for the same key into one execution.
+
+    The first caller starts `fn` as its own task and everyone, including
+    that caller, awaits it through a shield, so a cancelled request does
+    not abort the work the others are waiting on.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[
+            str, asyncio.Task
+        ] = {}
+
+    def __contains__(self, key):
+        return key in self._inflight
+
+    async def do(
+        self,
+        key: str,
+        fn: Callable[[], Awaitable],
+    ):
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(
+                lambda done: self._forget(
+                    key, done
+                )
+            )
+        return await asyncio.shield(task)
+
+    def _forget(self, key, task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]